@@ -3,20 +3,50 @@ import streamlit as st
 
 from src.client import ChromaDBClient
 from src.utils import save_uploaded_file, is_api_key_valid, load_yaml_file
-from src.main import get_response, upload
+from src.main import get_response, upload_buffer
+from src.jobs import JobQueue, start_workers
+from src.dedup import ChunkDeduplicator
 
 
 cwd = os.getcwd()
-api_status = is_api_key_valid()
-st.write(f'API Key Status : {api_status}')
-
 config = load_yaml_file(
     filename=os.path.join(cwd, 'config.yaml')
     )
 
-client = ChromaDBClient(openai_api_key=os.getenv('OPENAI_API_KEY'),
-                        host=os.getenv('HOST'),
-                        port=os.getenv('PORT'))
+api_status = is_api_key_valid()
+st.write(f'API Key Status : {api_status}')
+
+
+@st.cache_resource(ttl=config['cache_ttl'])
+def get_client():
+    client = ChromaDBClient(openai_api_key=os.getenv('OPENAI_API_KEY'),
+                            host=os.getenv('HOST'),
+                            port=os.getenv('PORT'))
+    if client.client is None:
+        # Raising keeps the failed client out of the cache, so the next
+        # rerun connects again.
+        raise ConnectionError('Could not connect to ChromaDB')
+    return client
+
+
+@st.cache_resource
+def get_queue():
+    queue = JobQueue()
+    start_workers(num_workers=config['num_workers'])
+    return queue
+
+
+@st.cache_data(ttl=60)
+def get_documents(collection_name):
+    return client.get_documents(collection_name=collection_name)
+
+
+try:
+    client = get_client()
+except ConnectionError as e:
+    st.error(body=f'{e}, retrying on the next rerun')
+    st.stop()
+queue = get_queue()
 
 
 def reset_session():
@@ -28,14 +58,54 @@ st.title("Document GPT")
 
 with st.sidebar:
     st.subheader(body='Database Info')
-    if client.get_all_collections() != None:
+    collections = client.get_all_collections()
+    if collections != None:
         col = st.selectbox(
                         label='Select collection',
-                        options=client.get_all_collections()
+                        options=collections
                         )
     else:
         st.write("Create a collection")
 
+    if collections:
+        with st.expander(label='Collection stats'):
+            if st.button(label='Compute stats'):
+                stats = client.get_stats(collection_name=col)
+                if stats is None:
+                    st.error(body='Could not compute stats')
+                else:
+                    st.write(f"Chunks : {stats['count']}")
+                    st.write("Average chunk length : "
+                             f"{stats['avg_chunk_length']:.0f} characters")
+                    st.table([
+                        {'source': source,
+                         'chunks': chunks,
+                         'pages': len(stats['pages'][source])}
+                        for source, chunks in stats['sources'].items()
+                    ])
+                if config['dedup']['enabled']:
+                    report = ChunkDeduplicator(
+                        collection_id=client.get_collection(col).id
+                        ).report()
+                    st.write(f"Near-duplicates avoided : {report['avoided']}"
+                             f" of {report['chunks']} chunks")
+
+    doc_ids = list()
+    page_range = (None, None)
+    if collections:
+        st.subheader(body='Search scope')
+        doc_ids = st.multiselect(label='Documents',
+                                 options=get_documents(col),
+                                 placeholder='All documents')
+        page_col1, page_col2 = st.columns(2)
+        with page_col1:
+            first_page = st.number_input(label='From page', min_value=0,
+                                         value=0, help='0 for no limit')
+        with page_col2:
+            last_page = st.number_input(label='To page', min_value=0,
+                                        value=0, help='0 for no limit')
+        page_range = (first_page or None, last_page or None)
+
     col_name = st.text_input(label='Name of collection')
     col1, col2 = st.columns(2)
     with col1:
@@ -53,23 +123,50 @@ with st.sidebar:
                 accept_multiple_files=False
             )
     if uploaded_files is not None:
-        file_path = save_uploaded_file(uploaded_files)
         if st.button(label='Upload'):
-            with st.spinner(text='Uploading'):
-                upload_time = upload(
-                                client=client,
-                                collection_name=col,
-                                file_path=file_path,
-                            )
-            st.success(body='Data Uploaded', icon='✅')
-            os.remove(file_path)
-            reset_session()
+            spool_threshold = config['spool_threshold_mb'] * 1024 * 1024
+            if config['inline_uploads'] \
+                    and uploaded_files.size <= spool_threshold:
+                # Parsed in place from the upload buffer, in this process.
+                with st.spinner(text='Uploading'):
+                    result = upload_buffer(client=client,
+                                           collection_name=col,
+                                           buffer=uploaded_files.getbuffer(),
+                                           file_name=uploaded_files.name)
+                if result is not None:
+                    st.success(body='Data Uploaded', icon='✅')
+                    reset_session()
+                else:
+                    st.error(body='Upload failed')
+            else:
+                file_path = save_uploaded_file(uploaded_files)
+                if file_path is not None:
+                    queue.submit(collection_name=col, file_path=file_path)
+                    st.success(body='Upload queued', icon='✅')
+                    reset_session()
+                else:
+                    st.error(body='Could not save the uploaded file')
         else:
             pass
 
     else:
         pass
 
+    st.subheader(body='Uploads')
+    st.button(label='Refresh')
+    for job in queue.list_jobs(limit=5):
+        name = os.path.basename(job['file_path'])
+        st.write(f"**{name}** → {job['collection_name']} : {job['status']}")
+        if job['status'] == 'running':
+            st.progress(value=job['progress'],
+                        text=f"{job['done']}/{job['total'] or '?'} chunks")
+            if job['throughput'] is not None:
+                eta = job['eta'] if job['eta'] is not None else 0
+                st.caption(f"{job['throughput']:.1f} chunks/s, "
+                           f"ETA {eta:.0f}s")
+        elif job['status'] == 'failed':
+            st.caption(job['error'])
+
 
 try:
     col_info = client.get_info(collection_name=col)
@@ -78,7 +175,7 @@ except NameError:
     st.write("Collection Name : **None**")
 
 
-if client.get_all_collections() != []:
+if collections != []:
     if "openai_model" not in st.session_state:
         st.session_state["openai_model"] = "gpt-3.5-turbo"
 
@@ -96,11 +193,17 @@ if client.get_all_collections() != []:
 
         with st.chat_message("assistant"):
             msg = st.session_state.messages[-1]['content']
-            response = get_response(
+            result = get_response(
                                 client=client,
                                 collection_name=col,
-                                message=msg)['response']
+                                message=msg,
+                                doc_ids=doc_ids,
+                                page_range=page_range)
+            response = result['response']
             st.markdown(response)
+            latencies = ', '.join(f'{latency:.2f}s'
+                                  for latency in result['llm_latencies'])
+            st.caption(f"{result['llm_calls']} LLM calls ({latencies})")
 
         st.session_state.messages.append({
                                         "role": "assistant",
@@ -0,0 +1,178 @@
+"""
+Chat Mode Benchmark - Compare the LLM round trips of the chat modes offline.
+
+Every mode answers the same questions over an in-memory index built from
+synthetic chunks. The LLM is a stub that sleeps for a fixed delay per call
+and embeddings are mocked, so no API key or Chroma server is needed and the
+latencies measure only the number of sequential LLM calls of each mode.
+
+The stub follows the ReAct format when it is offered the query tool, so the
+'react' agent makes its usual tool call before answering.
+
+Example Usage:
+    python benchmarks/chat_modes.py
+    python benchmarks/chat_modes.py --turns 20 --modes context react
+    python benchmarks/chat_modes.py --stream
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+from typing import Any
+
+cwd = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, cwd)
+
+MODES = ['context', 'condense_plus_context', 'condense_question', 'react',
+         'simple']
+
+QUESTIONS = [
+    'What is the notice period?',
+    'Who signs the agreement?',
+    'When is the invoice due?',
+    'How is the fee calculated?',
+]
+
+
+def stub_llm(delay):
+    """
+    Create an LLM that sleeps for `delay` seconds and returns a fixed answer.
+
+    Args:
+        delay (float): Simulated round trip time in seconds.
+
+    Returns:
+        CustomLLM: The stub.
+    """
+    from llama_index.llms import (
+        CustomLLM, CompletionResponse, CompletionResponseGen, LLMMetadata
+        )
+    from llama_index.llms.base import llm_completion_callback
+
+    def reply(prompt):
+        if 'query_engine_tool' in prompt \
+                and 'Action: query_engine_tool' not in prompt:
+            return ('Thought: I need to use a tool to help me answer the '
+                    'question.\n'
+                    'Action: query_engine_tool\n'
+                    'Action Input: {"input": "stub question"}')
+        return ('Thought: I can answer without using any more tools.\n'
+                'Answer: stub answer')
+
+    class StubLLM(CustomLLM):
+        delay: float = 0.0
+
+        @property
+        def metadata(self) -> LLMMetadata:
+            return LLMMetadata(is_chat_model=False)
+
+        @llm_completion_callback()
+        def complete(self, prompt: str, **kwargs: Any) -> CompletionResponse:
+            time.sleep(self.delay)
+            return CompletionResponse(text=reply(prompt))
+
+        @llm_completion_callback()
+        def stream_complete(self, prompt: str,
+                            **kwargs: Any) -> CompletionResponseGen:
+            def gen() -> CompletionResponseGen:
+                time.sleep(self.delay)
+                text = reply(prompt)
+                yield CompletionResponse(text=text, delta=text)
+
+            return gen()
+
+    return StubLLM(delay=delay)
+
+
+def build_index(llm, callback_manager, num_chunks):
+    from llama_index import ServiceContext, VectorStoreIndex
+    from llama_index.token_counter.mock_embed_model import MockEmbedding
+    from llama_index.schema import TextNode
+
+    service_context = ServiceContext.from_defaults(
+        llm=llm, embed_model=MockEmbedding(embed_dim=8),
+        callback_manager=callback_manager
+        )
+    nodes = [
+        TextNode(text=f'Clause {i}: the parties agree on term {i}.',
+                 metadata={'source': 'contract.pdf', 'Page_No': i // 4,
+                           'chunk': i % 4, 'tokens': 12})
+        for i in range(num_chunks)
+        ]
+    return VectorStoreIndex(nodes, service_context=service_context)
+
+
+def run_mode(mode, turns, delay, num_chunks, stream=False):
+    """
+    Hold a conversation of `turns` questions in one chat mode.
+
+    Args:
+        mode (str): A llama_index ChatMode value.
+        turns (int): Number of questions to ask.
+        delay (float): Simulated LLM round trip time in seconds.
+        num_chunks (int): Number of chunks in the index.
+        stream (bool): Use `stream_chat` and read the whole stream.
+
+    Returns:
+        dict: Mean and max 'llm_calls' per turn and mean 'latency' per turn
+              in milliseconds.
+    """
+    from llama_index.callbacks import CallbackManager
+    from llama_index.chat_engine.types import ChatMode
+    from src.main import context_kwargs
+    from src.metrics import LLMCallTracker
+    from src.utils import load_yaml_file
+
+    config = load_yaml_file(filename=os.path.join(cwd, 'config.yaml'))
+    callback_manager = CallbackManager([])
+    index = build_index(stub_llm(delay), callback_manager, num_chunks)
+    chat_engine = index.as_chat_engine(chat_mode=ChatMode(mode),
+                                       **context_kwargs(config))
+
+    calls = list()
+    latencies = list()
+    for i in range(turns):
+        tracker = LLMCallTracker()
+        callback_manager.set_handlers([tracker])
+        start = time.perf_counter()
+        if stream:
+            response = chat_engine.stream_chat(QUESTIONS[i % len(QUESTIONS)])
+            for _ in response.response_gen:
+                pass
+        else:
+            chat_engine.chat(QUESTIONS[i % len(QUESTIONS)])
+        latencies.append((time.perf_counter() - start) * 1000)
+        calls.append(tracker.calls)
+
+    return {
+        'llm_calls': statistics.mean(calls),
+        'max_llm_calls': max(calls),
+        'latency': statistics.mean(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--turns', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.05,
+                        help='simulated LLM round trip in seconds')
+    parser.add_argument('--chunks', type=int, default=32)
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES)
+    parser.add_argument('--stream', action='store_true',
+                        help='answer with stream_chat')
+    args = parser.parse_args()
+
+    print(f'{args.turns} turns, {args.delay * 1000:.0f} ms per LLM call'
+          f'{", streaming" if args.stream else ""}')
+    print(f'  {"mode":<22} {"calls/turn":>10} {"max":>4} {"ms/turn":>9}')
+    for mode in args.modes:
+        result = run_mode(mode, args.turns, args.delay, args.chunks,
+                          stream=args.stream)
+        print(f'  {mode:<22} {result["llm_calls"]:10.2f} '
+              f'{result["max_llm_calls"]:4d} {result["latency"]:9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Startup Benchmark - Measure import time and cold start of the app modules.
+
+Each module is imported in a fresh interpreter, so the timings include every
+dependency it pulls in at import time. The cold start section times the
+per-rerun work of `app.py` (config load and API key check) before and after
+the process-level caches are warm.
+
+Example Usage:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --repeat 10 --skip-api
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+cwd = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, cwd)
+
+MODULES = ['src.utils', 'src.client', 'src.main', 'src.jobs', 'src.batch']
+
+
+def time_import(module, repeat):
+    """
+    Time `import module` in fresh interpreters.
+
+    Args:
+        module (str): The module to import.
+        repeat (int): Number of interpreters to start.
+
+    Returns:
+        float: Median import time in milliseconds, excluding interpreter
+               startup.
+    """
+    code = ('import time; s = time.perf_counter(); '
+            f'import {module}; print(time.perf_counter() - s)')
+    timings = list()
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], cwd=cwd,
+                             capture_output=True, text=True, check=True)
+        timings.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+    return statistics.median(timings)
+
+
+def time_call(func, repeat):
+    start = time.perf_counter()
+    func()
+    cold = (time.perf_counter() - start) * 1000
+
+    timings = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return cold, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--skip-api', action='store_true',
+                        help='do not call the OpenAI API key check')
+    args = parser.parse_args()
+
+    print('import time (ms, median of fresh interpreters)')
+    for module in MODULES:
+        print(f'  {module:<12} {time_import(module, args.repeat):8.1f}')
+
+    from src.utils import load_yaml_file, is_api_key_valid
+
+    calls = {
+        'load config': lambda: load_yaml_file(
+            filename=os.path.join(cwd, 'config.yaml')
+            ),
+    }
+    if not args.skip_api:
+        calls['api key check'] = is_api_key_valid
+
+    print('cold start (ms, first call / median cached call)')
+    for name, func in calls.items():
+        cold, warm = time_call(func, args.repeat)
+        print(f'  {name:<14} {cold:8.2f} / {warm:8.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,231 @@
+"""
+Batch Answering - A module for answering many questions from a JSONL file.
+
+Questions are streamed from the input file and answered by a bounded pool of
+worker threads. Each result is appended to the output JSONL as soon as it
+completes, with the retrieved chunk ids and the latency of every stage.
+Questions that already have an answer in the output file are skipped, so an
+interrupted run can be restarted with the same arguments.
+
+Functions:
+    read_questions(file_path): Stream (id, question) pairs from a JSONL file.
+    load_answered(file_path): Read the ids already answered in an output file.
+    summarize(records, elapsed): Compute throughput and latency percentiles.
+    run(client, collection_name, input_path, output_path): Answer all
+                                                           questions.
+
+Example Usage:
+    python -m src.batch questions.jsonl --collection database \\
+        --output answers.jsonl --workers 8
+"""
+
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .main import build_index, answer
+from .logger import logging
+
+STAGES = ['retrieve', 'synthesize', 'total']
+
+
+def read_questions(file_path, id_field='id', question_field='question'):
+    """
+    Stream questions from a JSONL file.
+
+    Args:
+        file_path (str): The JSONL file, one JSON object per line.
+        id_field (str): Field holding the question id. The line number is
+                        used when it is missing (default is 'id').
+        question_field (str): Field holding the question text
+                              (default is 'question').
+
+    Yields:
+        tuple: The question id as a string and the question text.
+    """
+    with open(file_path, 'r') as f:
+        for line_no, line in enumerate(f, start=1):
+            if line.strip() == '':
+                continue
+            record = json.loads(line)
+            yield str(record.get(id_field, line_no)), record[question_field]
+
+
+def load_answered(file_path):
+    """
+    Read the ids of the questions answered without error in an output file.
+
+    Args:
+        file_path (str): The output JSONL file of a previous run.
+
+    Returns:
+        set: The answered question ids.
+    """
+    answered = set()
+    if not os.path.exists(file_path):
+        return answered
+
+    with open(file_path, 'r') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if 'error' not in record:
+                answered.add(record['id'])
+    return answered
+
+
+def percentile(values, q):
+    """
+    Compute the q-th percentile of values by linear interpolation.
+
+    Args:
+        values (list): The values.
+        q (float): The percentile, between 0 and 100.
+
+    Returns:
+        float: The percentile, or None if values is empty.
+    """
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def summarize(records, elapsed):
+    """
+    Summarize a run.
+
+    Args:
+        records (list): The output records written during the run.
+        elapsed (float): Wall time of the run in seconds.
+
+    Returns:
+        dict: Counts, throughput in questions per second and p50/p90/p99
+              latency in seconds per stage.
+    """
+    answered = [r for r in records if 'error' not in r]
+    summary = {
+        'answered': len(answered),
+        'failed': len(records) - len(answered),
+        'elapsed': elapsed,
+        'throughput': len(answered) / elapsed if elapsed > 0 else None,
+        'latency': dict(),
+    }
+    for stage in STAGES:
+        values = [r['latency'][stage] for r in answered]
+        summary['latency'][stage] = {
+            f'p{q}': percentile(values, q) for q in (50, 90, 99)
+        }
+    return summary
+
+
+def _answer(index, question_id, question):
+    start = time.time()
+    try:
+        result = answer(index=index, question=question)
+    except Exception as e:
+        logging.error(msg=f'Batch question {question_id}: {e}')
+        return {'id': question_id, 'question': question, 'error': str(e)}
+
+    result['latency']['total'] = time.time() - start
+    return {'id': question_id, 'question': question, **result}
+
+
+def run(client, collection_name, input_path, output_path, workers=4,
+        id_field='id', question_field='question'):
+    """
+    Answer every question of a JSONL file that is not yet answered in the
+    output file.
+
+    At most `workers` questions are in flight at a time, so memory stays
+    bounded regardless of the input size.
+
+    Args:
+        client (ChromaDBClient): An instance of the ChromaDBClient for
+                                 database interaction.
+        collection_name (str): The collection to query.
+        input_path (str): The JSONL file of questions.
+        output_path (str): The JSONL file answers are appended to.
+        workers (int): Number of concurrent questions (default is 4).
+        id_field (str): Field holding the question id (default is 'id').
+        question_field (str): Field holding the question text
+                              (default is 'question').
+
+    Returns:
+        dict: The run summary, see `summarize`, plus the 'index_time' spent
+              creating the index.
+    """
+    answered = load_answered(output_path)
+    if answered:
+        logging.info(msg=f'Batch resuming, {len(answered)} already answered')
+
+    start = time.time()
+    index = build_index(client=client, collection_name=collection_name)
+    index_dur = time.time() - start
+
+    records = list()
+    with open(output_path, 'a') as out, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+
+        def drain(pending):
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                record = future.result()
+                out.write(json.dumps(record) + '\n')
+                out.flush()
+                records.append({k: v for k, v in record.items()
+                                if k in ('latency', 'error')})
+            return pending
+
+        pending = set()
+        for question_id, question in read_questions(
+                input_path, id_field=id_field, question_field=question_field):
+            if question_id in answered:
+                continue
+            if len(pending) >= workers:
+                pending = drain(pending)
+            pending.add(pool.submit(_answer, index, question_id, question))
+
+        while pending:
+            pending = drain(pending)
+
+    summary = summarize(records, elapsed=time.time() - start)
+    summary['index_time'] = index_dur
+    logging.info(msg=f'Batch summary: {summary}')
+    return summary
+
+
+if __name__ == '__main__':
+    from .client import ChromaDBClient
+
+    parser = argparse.ArgumentParser(
+        description='Answer questions from a JSONL file.'
+        )
+    parser.add_argument('input', help='JSONL file of questions')
+    parser.add_argument('--collection', required=True,
+                        help='collection to query')
+    parser.add_argument('--output', required=True,
+                        help='JSONL file answers are appended to')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--id-field', default='id')
+    parser.add_argument('--question-field', default='question')
+    args = parser.parse_args()
+
+    client = ChromaDBClient(openai_api_key=os.getenv('OPENAI_API_KEY'),
+                            host=os.getenv('HOST'),
+                            port=os.getenv('PORT'))
+    summary = run(client=client,
+                  collection_name=args.collection,
+                  input_path=args.input,
+                  output_path=args.output,
+                  workers=args.workers,
+                  id_field=args.id_field,
+                  question_field=args.question_field)
+    print(json.dumps(summary, indent=2))
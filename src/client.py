@@ -44,9 +44,19 @@ Methods:
     create_collection(collection_name): Create a new collection or get an
                                         existing one by name.
     load_data(file_path): Load data from a file into ChromaDB.
+    load_buffer(buffer, file_name): Load data from a PDF held in memory.
     get_info(collection_name, n=10): Get information about a collection,
                                      including the count of items and a
                                      preview of the first 'n' items.
+    scan(collection_name, include): Iterate over a collection page by page.
+    get_stats(collection_name): Compute chunk counts per source file and
+                                page, and the average chunk length.
+    get_documents(collection_name): List the source documents stored in a
+                                    collection.
+    export_collection(collection_name, file_path): Export a collection with
+                                                   its embeddings to Parquet.
+    import_collection(collection_name, file_path): Bulk-load a collection
+                                                   from a Parquet export.
 
 Example Usage:
     client = ChromaDBClient(openai_api_key='your_openai_api_key')
@@ -54,19 +64,72 @@ Example Usage:
     collection_info = client.get_info('my_collection')
 """
 
+import io
 import os
 import time
-import chromadb
-from chromadb.utils import embedding_functions
-
-from llama_index import SimpleDirectoryReader
-from llama_index.node_parser import TokenTextSplitter
 
 from .utils import load_yaml_file
 from .logger import logging
 
 cwd = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
 
+ROMAN = [(1000, 'm'), (900, 'cm'), (500, 'd'), (400, 'cd'), (100, 'c'),
+         (90, 'xc'), (50, 'l'), (40, 'xl'), (10, 'x'), (9, 'ix'), (5, 'v'),
+         (4, 'iv'), (1, 'i')]
+
+
+def _format_label(number, style):
+    if style in ('/R', '/r'):
+        roman = ''
+        for value, numeral in ROMAN:
+            count, number = divmod(number, value)
+            roman += numeral * count
+        return roman.upper() if style == '/R' else roman
+    if style in ('/A', '/a'):
+        letter = chr(ord('A') + (number - 1) % 26) * ((number - 1) // 26 + 1)
+        return letter if style == '/A' else letter.lower()
+    if style == '/D':
+        return str(number)
+    return ''
+
+
+def page_labels(reader):
+    """
+    Get the label of every page of a PDF, e.g. 'iv' or 'A-2', as shown by
+    PDF viewers and stored as 'page_label' by llama_index's PDF reader.
+
+    Args:
+        reader (PyPDF2.PdfReader): The opened PDF.
+
+    Returns:
+        list: One label per page. Pages are numbered from 1 when the PDF
+              defines no labels.
+    """
+    num_pages = len(reader.pages)
+    labels = [str(i + 1) for i in range(num_pages)]
+    root = reader.trailer['/Root']
+    if '/PageLabels' not in root:
+        return labels
+
+    ranges = list()
+    nodes = [root['/PageLabels'].get_object()]
+    while nodes:
+        node = nodes.pop()
+        nums = node.get('/Nums', [])
+        for i in range(0, len(nums) - 1, 2):
+            ranges.append((int(nums[i]), nums[i + 1].get_object()))
+        nodes.extend(kid.get_object() for kid in node.get('/Kids', []))
+
+    ranges.sort(key=lambda r: r[0])
+    for k, (first_page, spec) in enumerate(ranges):
+        end = ranges[k + 1][0] if k + 1 < len(ranges) else num_pages
+        start = int(spec.get('/St', 1))
+        for page in range(first_page, min(end, num_pages)):
+            labels[page] = spec.get('/P', '') + _format_label(
+                start + page - first_page, spec.get('/S')
+                )
+    return labels
+
 
 class ChromaDBClient:
     """
@@ -99,9 +162,22 @@ class ChromaDBClient:
         create_collection(collection_name): Create a new collection or get an
                                             existing one by name.
         load_data(file_path): Load data from a file into ChromaDB.
+        load_buffer(buffer, file_name): Load data from a PDF held in memory.
         get_info(collection_name, n=10): Get information about a collection,
                                          including the count of items and a
                                          preview of the first 'n' items.
+        scan(collection_name, include): Iterate over a collection page by
+                                        page.
+        get_stats(collection_name): Compute chunk counts per source file and
+                                    page, and the average chunk length.
+        get_documents(collection_name): List the source documents stored in
+                                        a collection.
+        export_collection(collection_name, file_path): Export a collection
+                                                       with its embeddings
+                                                       to Parquet.
+        import_collection(collection_name, file_path): Bulk-load a
+                                                       collection from a
+                                                       Parquet export.
 
     Example Usage:
         client = ChromaDBClient(openai_api_key='your_openai_api_key')
@@ -161,6 +237,8 @@ class ChromaDBClient:
         Returns:
             chromadb.HttpClient: An instance of the ChromaDB HTTP client.
         """
+        import chromadb
+
         try:
             client = chromadb.HttpClient(
                 host=self.host,
@@ -180,6 +258,8 @@ class ChromaDBClient:
             embedding_functions.OpenAIEmbeddingFunction: An instance of the
             OpenAI text embedding model.
         """
+        from chromadb.utils import embedding_functions
+
         try:
             model = embedding_functions.OpenAIEmbeddingFunction(
                 api_key=self.openai_api_key,
@@ -243,6 +323,8 @@ class ChromaDBClient:
             return None
 
     def __dataloader(self, file_path):
+        from llama_index import SimpleDirectoryReader
+
         try:
             start = time.time()
             loader = SimpleDirectoryReader(
@@ -262,6 +344,8 @@ class ChromaDBClient:
             return None
 
     def __node_splitter(self):
+        from llama_index.node_parser import TokenTextSplitter
+
         try:
             start = time.time()
             splitter = TokenTextSplitter(
@@ -282,6 +366,9 @@ class ChromaDBClient:
         """
         Load data from a file into ChromaDB.
 
+        PDFs are read like `load_buffer` reads them, so a file gets the same
+        chunks, metadata and ids whichever way it is uploaded.
+
         Args:
             file_path (str): The path to the data file to be uploaded to the
             database.
@@ -291,10 +378,16 @@ class ChromaDBClient:
         """
         try:
             start = time.time()
-            loader = self.__dataloader(file_path=file_path)
             splitter = self.__node_splitter()
+            if os.path.splitext(file_path)[1].lower() == '.pdf':
+                with open(file_path, 'rb') as stream:
+                    documents = self.__read_pdf(
+                        stream=stream, file_name=os.path.basename(file_path)
+                        )
+            else:
+                loader = self.__dataloader(file_path=file_path)
+                documents = loader.load_data()
 
-            documents = loader.load_data()
             nodes = splitter.get_nodes_from_documents(documents=documents)
             end = time.time()
             dur = end - start
@@ -306,6 +399,51 @@ class ChromaDBClient:
             logging.error(msg=f'Error: {e}')
             return None
 
+    def __read_pdf(self, stream, file_name):
+        import PyPDF2
+        from llama_index import Document
+
+        reader = PyPDF2.PdfReader(stream)
+        documents = list()
+        for page, label in zip(reader.pages, page_labels(reader)):
+            documents.append(Document(
+                text=page.extract_text(),
+                metadata={'page_label': label, 'file_name': file_name}
+            ))
+        return documents
+
+    def load_buffer(self, buffer, file_name):
+        """
+        Load data from a PDF held in memory, without writing it to disk.
+
+        Args:
+            buffer (file-like or bytes): The PDF content. A file-like
+                object, such as a Streamlit upload, and bytes are read in
+                place; other bytes-like objects are copied once.
+            file_name (str): The name of the uploaded file, stored as the
+                             chunks' source document.
+
+        Returns:
+            list: A list of data nodes loaded into the database.
+        """
+        try:
+            start = time.time()
+            stream = buffer if hasattr(buffer, 'read') else io.BytesIO(buffer)
+            stream.seek(0)
+
+            documents = self.__read_pdf(stream=stream, file_name=file_name)
+            splitter = self.__node_splitter()
+            nodes = splitter.get_nodes_from_documents(documents=documents)
+            end = time.time()
+            dur = end - start
+            logging.info(f'loaded buffer, Executed in {dur} seconds')
+
+            return nodes
+
+        except Exception as e:
+            logging.error(msg=f'Error: {e}')
+            return None
+
     def get_info(self, collection_name, n=10):
         """
         Get information about a collection, including the count of items and a
@@ -321,17 +459,15 @@ class ChromaDBClient:
         """
         try:
             start = time.time()
-            collection = self.client.get_collection(
-                name=collection_name,
-                embedding_function=self.__embedding_model()
-            )
+            collection = self.client.get_collection(name=collection_name)
             end = time.time()
 
             dur = end - start
 
             return {
                 'count': collection.count(),
-                'items': collection.peek(limit=n),
+                'items': collection.get(limit=n,
+                                        include=['metadatas', 'documents']),
                 'dur': dur
                 }
 
@@ -339,10 +475,307 @@ class ChromaDBClient:
             logging.error(msg=f'Error: {e}')
             return None
 
+    def scan_pages(self, collection_name, include=None, page_size=None,
+                   where=None):
+        """
+        Iterate over the pages of a collection.
+
+        Only the requested fields are fetched; embeddings are never
+        transferred unless asked for. Errors are raised rather than logged,
+        so a failed request never looks like the end of the collection.
+
+        Args:
+            collection_name (str): The name of the collection to scan.
+            include (list, optional): Fields to fetch besides the ids, any of
+                                      'metadatas', 'documents' and
+                                      'embeddings' (default is
+                                      ['metadatas']).
+            page_size (int, optional): Number of items fetched per request,
+                                       capped at `scan_page_size` in config.
+            where (dict, optional): A Chroma metadata filter.
+
+        Yields:
+            dict: One page as returned by `collection.get`, with 'ids' and
+                  the included fields.
+        """
+        include = ['metadatas'] if include is None else list(include)
+        max_page_size = self.config['scan_page_size']
+        page_size = min(page_size or max_page_size, max_page_size)
+
+        collection = self.client.get_collection(name=collection_name)
+        offset = 0
+        while True:
+            page = collection.get(limit=page_size, offset=offset,
+                                  include=include, where=where)
+            ids = page['ids']
+            if not ids:
+                break
+
+            yield page
+
+            if len(ids) < page_size:
+                break
+            offset += len(ids)
+
+    def scan(self, collection_name, include=None, page_size=None,
+             where=None):
+        """
+        Iterate over the items of a collection, fetching one page at a time.
+
+        Args:
+            collection_name (str): The name of the collection to scan.
+            include (list, optional): Fields to fetch besides the ids, see
+                                      `scan_pages` (default is
+                                      ['metadatas']).
+            page_size (int, optional): Number of items fetched per request.
+            where (dict, optional): A Chroma metadata filter.
+
+        Yields:
+            dict: One item per record, with 'id' and the singular form of
+                  every included field ('metadata', 'document', 'embedding').
+        """
+        include = ['metadatas'] if include is None else list(include)
+        for page in self.scan_pages(collection_name=collection_name,
+                                    include=include,
+                                    page_size=page_size,
+                                    where=where):
+            for i, item_id in enumerate(page['ids']):
+                item = {'id': item_id}
+                for field in include:
+                    item[field[:-1]] = page[field][i]
+                yield item
+
+    def export_collection(self, collection_name, file_path, page_size=None):
+        """
+        Export a collection with its embeddings to a Parquet file.
+
+        The collection is streamed page by page, each page becoming one row
+        group, so memory use is bounded by the page size. The file is written
+        under a temporary name and only renamed to `file_path` once every
+        item has been written, so a failed export never leaves a truncated
+        backup behind.
+
+        Args:
+            collection_name (str): The name of the collection to export.
+            file_path (str): The Parquet file to write.
+            page_size (int, optional): Number of items per page.
+
+        Returns:
+            int: The number of exported items, or None if the export failed.
+        """
+        import json
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tmp_path = f'{file_path}.tmp'
+        try:
+            start = time.time()
+            collection = self.client.get_collection(name=collection_name)
+            expected = collection.count()
+            schema = pa.schema(
+                [('id', pa.string()),
+                 ('document', pa.string()),
+                 ('metadata', pa.string()),
+                 ('embedding', pa.list_(pa.float32()))],
+                metadata={'collection_metadata': json.dumps(
+                    collection.metadata
+                    )}
+            )
+
+            count = 0
+            with pq.ParquetWriter(tmp_path, schema) as writer:
+                for page in self.scan_pages(
+                        collection_name=collection_name,
+                        include=['documents', 'metadatas', 'embeddings'],
+                        page_size=page_size):
+                    writer.write_table(pa.table({
+                        'id': page['ids'],
+                        'document': page['documents'],
+                        'metadata': [json.dumps(m)
+                                     for m in page['metadatas']],
+                        'embedding': page['embeddings'],
+                    }, schema=schema))
+                    count += len(page['ids'])
+
+            if count != expected:
+                raise RuntimeError(f'Exported {count} of {expected} items, '
+                                   'was the collection modified?')
+            os.replace(tmp_path, file_path)
+
+            end = time.time()
+            logging.info(f'export_collection {collection_name}, {count} '
+                         f'items, Executed in {end - start} seconds')
+            return count
+
+        except Exception as e:
+            logging.error(msg=f'Error: {e}')
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+    def import_collection(self, collection_name, file_path,
+                          batch_size=None):
+        """
+        Bulk-load a collection from a Parquet file written by
+        `export_collection`.
+
+        The stored embeddings are inserted as they are, so the embedding
+        model is never called. The chunks are registered as documents and
+        added to the dedup index, so later uploads are checked against them.
+
+        Args:
+            collection_name (str): The collection to load into. It is created
+                                   with the exported collection metadata if
+                                   it does not exist.
+            file_path (str): The Parquet file to read.
+            batch_size (int, optional): Number of items per upsert, capped at
+                                        the server's maximum batch size
+                                        (default is `import_batch_size` in
+                                        config).
+
+        Returns:
+            int: The number of imported items, or None if the import failed.
+        """
+        import json
+        import pyarrow.parquet as pq
+        from .dedup import ChunkDeduplicator
+        from .registry import DocumentRegistry
+
+        try:
+            start = time.time()
+            parquet_file = pq.ParquetFile(file_path)
+            schema_metadata = parquet_file.schema_arrow.metadata or dict()
+            collection_metadata = json.loads(
+                schema_metadata.get(b'collection_metadata', b'null')
+                )
+
+            collection = self.client.get_or_create_collection(
+                name=collection_name,
+                metadata=collection_metadata,
+                embedding_function=self.__embedding_model()
+            )
+
+            batch_size = min(batch_size or self.config['import_batch_size'],
+                             self.client.max_batch_size)
+
+            registry = DocumentRegistry()
+            dedup = None
+            if self.config['dedup']['enabled']:
+                dedup = ChunkDeduplicator(collection_id=collection.id)
+
+            count = 0
+            for batch in parquet_file.iter_batches(batch_size=batch_size):
+                columns = batch.to_pydict()
+                metadatas = [json.loads(m) for m in columns['metadata']]
+                collection.upsert(
+                    ids=columns['id'],
+                    documents=columns['document'],
+                    metadatas=metadatas,
+                    embeddings=columns['embedding']
+                )
+                registry.add(collection.id,
+                             [m['source'] for m in metadatas
+                              if m and 'source' in m])
+                if dedup is not None:
+                    dedup.add(columns['id'], columns['document'])
+                    dedup.commit()
+                count += batch.num_rows
+
+            end = time.time()
+            logging.info(f'import_collection {collection_name}, {count} '
+                         f'items, Executed in {end - start} seconds')
+            return count
+
+        except Exception as e:
+            logging.error(msg=f'Error: {e}')
+            return None
+
+    def get_stats(self, collection_name, page_size=None):
+        """
+        Compute collection statistics in a single streaming pass.
+
+        Args:
+            collection_name (str): The name of the collection.
+            page_size (int, optional): Number of items fetched per request.
+
+        Returns:
+            dict: The 'count' of chunks, the chunk count per source file as
+                  'sources', the chunk count per page of every source file as
+                  'pages' and the 'avg_chunk_length' in characters, or None
+                  if the scan failed.
+        """
+        start = time.time()
+        count = 0
+        length = 0
+        sources = dict()
+        pages = dict()
+
+        try:
+            for item in self.scan(collection_name=collection_name,
+                                  include=['metadatas', 'documents'],
+                                  page_size=page_size):
+                metadata = item['metadata'] or dict()
+                source = metadata.get('source', 'unknown')
+                page = metadata.get('Page_No', 'unknown')
+
+                count += 1
+                length += len(item['document'] or '')
+                sources[source] = sources.get(source, 0) + 1
+                source_pages = pages.setdefault(source, dict())
+                source_pages[page] = source_pages.get(page, 0) + 1
+
+        except Exception as e:
+            logging.error(msg=f'Error: {e}')
+            return None
+
+        end = time.time()
+        logging.info(f'get_stats, Executed in {end - start} seconds')
+
+        return {
+            'count': count,
+            'sources': sources,
+            'pages': pages,
+            'avg_chunk_length': length / count if count else 0.0
+            }
+
+    def get_documents(self, collection_name):
+        """
+        List the source documents stored in a collection.
+
+        The list is read from the document registry. A collection filled
+        before the registry existed is scanned once and registered.
+
+        Args:
+            collection_name (str): The name of the collection.
+
+        Returns:
+            list: The sorted source file names.
+        """
+        from .registry import DocumentRegistry
+
+        try:
+            collection = self.client.get_collection(name=collection_name)
+            registry = DocumentRegistry()
+            documents = registry.list(collection.id)
+            if documents or collection.count() == 0:
+                return documents
+
+            sources = set()
+            for item in self.scan(collection_name=collection_name,
+                                  include=['metadatas']):
+                source = (item['metadata'] or dict()).get('source')
+                if source is not None:
+                    sources.add(source)
+            registry.add(collection.id, sources)
+            return sorted(sources)
+
+        except Exception as e:
+            logging.error(msg=f'Error: {e}')
+            return list()
+
     def get_all_collections(self):
         try:
-            client = self.__initialize_client()
-            collections = client.list_collections()
+            collections = self.client.list_collections()
             collections = [c.name for c in collections]
             return collections
 
@@ -351,9 +784,14 @@ class ChromaDBClient:
             return None
 
     def delete_collection(self, collection_name):
+        from .dedup import drop_index
+        from .registry import DocumentRegistry
+
         try:
-            client = self.__initialize_client()
-            client.delete_collection(name=collection_name)
+            collection = self.client.get_collection(name=collection_name)
+            self.client.delete_collection(name=collection_name)
+            DocumentRegistry().drop(collection.id)
+            drop_index(collection.id)
 
             logging.info(msg=f'Deleted {collection_name} collections')
 
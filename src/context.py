@@ -0,0 +1,167 @@
+"""
+Context Packing - A module for fitting retrieved chunks into a token budget.
+
+The retriever returns more candidate chunks than the prompt should hold. The
+packer keeps the highest-scoring chunks whose token counts, stored in the
+chunk metadata at ingest, fit in the budget, then merges chunks that follow
+each other on the same page of a file so their overlapping text is sent
+once. A merged chunk lists the ids of the chunks it was made from as
+'merged_ids'.
+
+Classes:
+    TokenBudgetPacker: Node postprocessor that packs chunks into a budget.
+
+Functions:
+    merge_text(first, second): Concatenate two chunks, dropping the overlap.
+    chunk_ids(node): Get the ids of the chunks a node was made from.
+
+Example Usage:
+    packer = TokenBudgetPacker(token_budget=2000)
+    chat_engine = index.as_chat_engine(similarity_top_k=10,
+                                       node_postprocessors=[packer])
+"""
+
+from typing import List, Optional
+
+from llama_index.bridge.pydantic import Field
+from llama_index.postprocessor.types import BaseNodePostprocessor
+from llama_index.schema import NodeWithScore, QueryBundle, TextNode
+
+# Metadata written at ingest for bookkeeping, not meant for the LLM.
+BOOKKEEPING_KEYS = ['id', 'tokens', 'chunk', 'page', 'Page_Text',
+                    'duplicate_of', 'merged_ids']
+
+# Characters per token used when a chunk has no stored token count.
+CHARS_PER_TOKEN = 4
+
+
+def merge_text(first, second, max_overlap=1000):
+    """
+    Concatenate two consecutive chunks, dropping the text that the end of the
+    first one shares with the start of the second one.
+
+    Args:
+        first (str): The earlier chunk.
+        second (str): The later chunk.
+        max_overlap (int): Longest overlap to look for, in characters.
+
+    Returns:
+        str: The merged text.
+    """
+    for size in range(min(len(first), len(second), max_overlap), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return first + ' ' + second
+
+
+def chunk_ids(node):
+    """
+    Get the ids of the stored chunks a node was made from.
+
+    Args:
+        node (BaseNode): A retrieved chunk, possibly merged by the packer.
+
+    Returns:
+        list: The chunk ids, in document order.
+    """
+    return list(node.metadata.get('merged_ids', [node.node_id]))
+
+
+def token_count(node):
+    """
+    Get the token count of a node from its metadata, falling back to an
+    estimate from its length for chunks stored without one.
+
+    Args:
+        node (BaseNode): The chunk.
+
+    Returns:
+        int: The number of tokens.
+    """
+    tokens = node.metadata.get('tokens')
+    if tokens is None:
+        tokens = len(node.get_content()) // CHARS_PER_TOKEN
+    return int(tokens)
+
+
+class TokenBudgetPacker(BaseNodePostprocessor):
+    """
+    Keep the highest-scoring chunks that fit in a token budget and merge
+    consecutive chunks of the same page of a source file. Chunks stored
+    without a 'source' are never merged.
+
+    Args:
+        token_budget (int): Maximum number of chunk tokens in the context.
+        chunk_overlap (int): Tokens shared by consecutive chunks, credited
+                             back when they are merged.
+    """
+
+    token_budget: int = Field(description='Maximum context tokens.')
+    chunk_overlap: int = Field(default=0,
+                               description='Tokens shared by neighbours.')
+
+    @classmethod
+    def class_name(cls) -> str:
+        return 'TokenBudgetPacker'
+
+    def _postprocess_nodes(
+        self,
+        nodes: List[NodeWithScore],
+        query_bundle: Optional[QueryBundle] = None,
+    ) -> List[NodeWithScore]:
+        ranked = sorted(nodes, key=lambda n: n.score or 0.0, reverse=True)
+
+        packed = list()
+        used = 0
+        for node in ranked:
+            tokens = token_count(node.node)
+            if used + tokens <= self.token_budget:
+                packed.append(node)
+                used += tokens
+
+        return self.__merge(packed)
+
+    def __merge(self, nodes):
+        def position(node):
+            metadata = node.node.metadata
+            return (str(metadata.get('source', '')),
+                    str(metadata.get('Page_No')),
+                    metadata.get('chunk', -1))
+
+        merged = list()
+        for node in sorted(nodes, key=position):
+            source, page, chunk = position(node)
+            if merged:
+                last = merged[-1]
+                last_source, last_page, last_chunk = position(last)
+                if source and (source, page) == (last_source, last_page) \
+                        and chunk >= 0 and chunk == last_chunk + 1:
+                    merged[-1] = self.__join(last, node)
+                    continue
+            merged.append(self.__exclude_bookkeeping(node))
+
+        return sorted(merged, key=lambda n: n.score or 0.0, reverse=True)
+
+    def __join(self, first, second):
+        metadata = dict(first.node.metadata)
+        metadata['chunk'] = second.node.metadata['chunk']
+        metadata['tokens'] = token_count(first.node) \
+            + token_count(second.node) - self.chunk_overlap
+        metadata['merged_ids'] = chunk_ids(first.node) \
+            + chunk_ids(second.node)
+
+        node = TextNode(
+            id_=first.node.node_id,
+            text=merge_text(first.node.get_content(),
+                            second.node.get_content()),
+            metadata=metadata,
+        )
+        return self.__exclude_bookkeeping(NodeWithScore(
+            node=node, score=max(first.score or 0.0, second.score or 0.0)
+            ))
+
+    def __exclude_bookkeeping(self, node):
+        for key in BOOKKEEPING_KEYS:
+            if key not in node.node.excluded_llm_metadata_keys:
+                node.node.excluded_llm_metadata_keys.append(key)
+        return node
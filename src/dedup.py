@@ -0,0 +1,421 @@
+"""
+Chunk Deduplication - A module for skipping near-duplicate chunks at ingest.
+
+Every chunk gets a MinHash signature over the word shingles of its normalized
+text, where case, whitespace and the wording of dates are ignored. Only chunks
+that contain the same other numbers can be near-duplicates, so chunks that
+differ in an amount, rate or term are always kept. Signatures are stored in
+a persistent locality-sensitive hashing (LSH) index per collection, so a chunk
+that is nearly identical to one already stored, e.g. from another revision of
+the same document, is found without comparing against every stored chunk.
+Near-duplicates are never embedded.
+
+In 'link' mode a near-duplicate is still stored, with its own text and
+metadata and a copy of the embedding of the chunk it duplicates, so it is
+found when retrieval is restricted to its source file or pages. In 'skip' mode
+it is dropped, so restricting a search to a revised document does not find the
+passages it shares with an earlier revision.
+
+Classes:
+    ChunkDeduplicator: Persistent per-collection near-duplicate filter.
+
+Functions:
+    normalize(text): Normalize text before shingling.
+    shingles(text, size): Get the set of word shingles of a text.
+    numbers(text): Get a digest of the numbers of a normalized text.
+    drop_index(collection_id): Delete the index of a collection.
+
+Example Usage:
+    dedup = ChunkDeduplicator(collection_id=collection.id)
+    keep = dedup.filter(nodes)
+    collection.upsert(...)
+    for node, duplicate_of in dedup.links():
+        ...
+    dedup.commit()
+    print(dedup.report())
+"""
+
+import os
+import re
+import sqlite3
+import hashlib
+from contextlib import contextmanager
+
+from .utils import load_yaml_file
+from .logger import logging
+
+cwd = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    id TEXT PRIMARY KEY,
+    signature BLOB NOT NULL,
+    numbers TEXT
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    key BLOB NOT NULL,
+    id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_key ON buckets (band, key);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+COUNTERS = ['chunks', 'embedded', 'skipped', 'linked']
+
+MONTHS = (r'(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|'
+          r'june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|'
+          r'nov(?:ember)?|dec(?:ember)?)')
+
+# Dates written as 2021-03-12, 12/03/2021, 12 March 2021, March 12, 2021 or
+# March 2021, matched in lower case.
+DATE_PATTERN = re.compile(
+    r'\b(?:\d{4}-\d{1,2}-\d{1,2}'
+    r'|\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}'
+    rf'|\d{{1,2}}(?:st|nd|rd|th)? (?:of )?{MONTHS}\.?,? \d{{4}}'
+    rf'|{MONTHS}\.? \d{{1,2}}(?:st|nd|rd|th)?,? \d{{4}}'
+    rf'|{MONTHS}\.? \d{{4}})\b'
+)
+
+
+def normalize(text):
+    """
+    Normalize text so that chunks differing only in case, whitespace or
+    dates get the same shingles. Every other number is kept.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text.
+    """
+    text = re.sub(r'\s+', ' ', text.lower()).strip()
+    return DATE_PATTERN.sub('<date>', text)
+
+
+def shingles(text, size):
+    """
+    Get the set of word shingles of a text.
+
+    Args:
+        text (str): The normalized text.
+        size (int): Number of words per shingle.
+
+    Returns:
+        set: The shingles. A text shorter than `size` words is a single
+             shingle.
+    """
+    words = text.split(' ')
+    if len(words) <= size:
+        return {text}
+    return {' '.join(words[i:i + size])
+            for i in range(len(words) - size + 1)}
+
+
+def numbers(text):
+    """
+    Get a digest of the numbers of a normalized text, in order. Dates are
+    already replaced by `normalize`, so they do not count.
+
+    Args:
+        text (str): The normalized text.
+
+    Returns:
+        str: The hex digest.
+    """
+    found = re.findall(r'\d+(?:[.,]\d+)*', text)
+    return hashlib.blake2b(' '.join(found).encode('utf-8'),
+                           digest_size=8).hexdigest()
+
+
+def _db_path(collection_id, db_dir=None):
+    if db_dir is None:
+        config = load_yaml_file(
+            filename=os.path.join(cwd, 'config.yaml')
+            )['dedup']
+        db_dir = os.path.join(cwd, config['dir'])
+    return os.path.join(db_dir, f'{collection_id}.db')
+
+
+def drop_index(collection_id, db_dir=None):
+    """
+    Delete the index of a collection, e.g. once the collection is deleted.
+
+    Args:
+        collection_id (str): The id of the collection.
+        db_dir (str, optional): Directory of the index databases.
+    """
+    path = _db_path(collection_id, db_dir=db_dir)
+    if os.path.exists(path):
+        os.remove(path)
+        logging.info(msg=f'Dropped dedup index {path}')
+
+
+class ChunkDeduplicator:
+    """
+    A persistent near-duplicate filter for the chunks of one collection.
+
+    `filter` only stages the signatures of the kept chunks; they are written
+    with `commit` once the chunks have been stored, so an upload that fails
+    before storing a batch does not leave chunks in the index that are not in
+    the collection.
+
+    The index is keyed by the collection's id rather than its name, so a
+    collection deleted and created again under the same name starts with an
+    empty index.
+
+    A stored chunk is only a near-duplicate if it also contains the same
+    numbers, apart from dates.
+
+    Args:
+        collection_id (str): The id of the collection the chunks are stored
+                             in.
+        threshold (float, optional): Minimum estimated Jaccard similarity
+                                     for a near-duplicate.
+        mode (str, optional): 'skip' to drop near-duplicates or 'link' to
+                              store them with the embedding of the chunk
+                              they duplicate, see `links`.
+        num_perm (int, optional): Number of MinHash permutations.
+        bands (int, optional): Number of LSH bands, must divide `num_perm`.
+        shingle_size (int, optional): Number of words per shingle.
+        db_dir (str, optional): Directory of the index databases.
+
+    All optional arguments default to the `dedup` section of config.
+    """
+
+    def __init__(self, collection_id, threshold=None, mode=None,
+                 num_perm=None, bands=None, shingle_size=None, db_dir=None):
+        import numpy as np
+
+        config = load_yaml_file(
+            filename=os.path.join(cwd, 'config.yaml')
+            )['dedup']
+        self.threshold = config['threshold'] if threshold is None \
+            else threshold
+        self.mode = mode or config['mode']
+        self.num_perm = num_perm or config['num_perm']
+        self.bands = bands or config['bands']
+        self.shingle_size = shingle_size or config['shingle_size']
+        self.rows = self.num_perm // self.bands
+
+        if self.mode not in ('skip', 'link'):
+            raise ValueError(f'Unknown dedup mode: {self.mode}')
+        if self.rows * self.bands != self.num_perm:
+            raise ValueError('bands must divide num_perm')
+
+        db_dir = db_dir or os.path.join(cwd, config['dir'])
+        os.makedirs(db_dir, exist_ok=True)
+        self.db_path = _db_path(collection_id, db_dir=db_dir)
+
+        rng = np.random.RandomState(1)
+        self.__a = rng.randint(1, MERSENNE_PRIME, size=self.num_perm,
+                               dtype=np.uint64)
+        self.__b = rng.randint(0, MERSENNE_PRIME, size=self.num_perm,
+                               dtype=np.uint64)
+
+        self.rollback()
+
+        with self.__connect() as conn:
+            conn.executescript(SCHEMA)
+            columns = [row[1] for row in
+                       conn.execute('PRAGMA table_info(signatures)')]
+            if 'numbers' not in columns:
+                conn.execute('ALTER TABLE signatures ADD COLUMN numbers TEXT')
+
+    @contextmanager
+    def __connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def signature(self, text):
+        """
+        Compute the MinHash signature of a text.
+
+        Args:
+            text (str): The normalized chunk text.
+
+        Returns:
+            numpy.ndarray: The signature, `num_perm` unsigned integers.
+        """
+        import numpy as np
+
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode('utf-8'),
+                                            digest_size=4).digest(),
+                            'little')
+             for s in shingles(text, self.shingle_size)),
+            dtype=np.uint64
+        )
+        values = (np.outer(hashes, self.__a) + self.__b) % MERSENNE_PRIME
+        return (values & MAX_HASH).min(axis=0)
+
+    def __band_keys(self, signature):
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes()
+                for i in range(self.bands)]
+
+    def __best_match(self, conn, signature, keys, digest):
+        import numpy as np
+
+        candidates = set()
+        for band, key in enumerate(keys):
+            candidates.update(self.__pending_buckets.get((band, key), ()))
+            candidates.update(row[0] for row in conn.execute(
+                'SELECT id FROM buckets WHERE band = ? AND key = ?',
+                (band, key)
+            ))
+
+        best_id, best = None, 0.0
+        for candidate in candidates:
+            other, _, other_digest = self.__pending.get(
+                candidate, (None, None, None)
+                )
+            if other is None:
+                row = conn.execute(
+                    'SELECT signature, numbers FROM signatures WHERE id = ?',
+                    (candidate,)
+                ).fetchone()
+                other = np.frombuffer(row[0], dtype=np.uint64)
+                other_digest = row[1]
+            if other_digest != digest:
+                continue
+            similarity = float(np.mean(signature == other))
+            if similarity > best:
+                best_id, best = candidate, similarity
+        return best_id, best
+
+    def filter(self, nodes):
+        """
+        Drop the near-duplicates of stored or previously kept chunks.
+
+        Args:
+            nodes (list): The llama_index nodes to check.
+
+        Returns:
+            list: The nodes to embed and store.
+        """
+        keep = list()
+        with self.__connect() as conn:
+            for node in nodes:
+                text = normalize(node.text)
+                signature = self.signature(text)
+                keys = self.__band_keys(signature)
+                digest = numbers(text)
+                match, similarity = self.__best_match(conn, signature, keys,
+                                                      digest)
+
+                self.__pending_counts['chunks'] += 1
+                if match == node.hash:
+                    # Already stored by an earlier, interrupted run.
+                    continue
+
+                if match is not None and similarity >= self.threshold:
+                    if self.mode == 'link':
+                        self.__pending_counts['linked'] += 1
+                        self.__pending_links.append((node, match))
+                    else:
+                        self.__pending_counts['skipped'] += 1
+                    continue
+
+                self.__pending_counts['embedded'] += 1
+                self.__stage(node.hash, signature, keys, digest)
+                keep.append(node)
+
+        return keep
+
+    def links(self):
+        """
+        Get the near-duplicates found by `filter` in 'link' mode since the
+        last `commit`. They are not embedded but stored with the embedding
+        of the chunk they duplicate, which is a kept chunk or a stored one.
+
+        Returns:
+            list: Tuples of the node and the id of the chunk it duplicates.
+        """
+        return list(self.__pending_links)
+
+    def add(self, ids, texts):
+        """
+        Add chunks that are already stored, e.g. bulk-loaded from an export,
+        so that later uploads are checked against them. They are written with
+        `commit`.
+
+        Args:
+            ids (list): The chunk ids, their content hashes.
+            texts (list): The chunk texts.
+        """
+        for item_id, text in zip(ids, texts):
+            text = normalize(text or '')
+            signature = self.signature(text)
+            self.__stage(item_id, signature, self.__band_keys(signature),
+                         numbers(text))
+
+    def __stage(self, item_id, signature, keys, digest):
+        self.__pending[item_id] = (signature, keys, digest)
+        for band, key in enumerate(keys):
+            self.__pending_buckets.setdefault(
+                (band, key), list()
+                ).append(item_id)
+
+    def commit(self):
+        """
+        Write the signatures and counters staged by `filter`.
+        """
+        with self.__connect() as conn:
+            with conn:
+                for item_id, (signature, keys, digest) \
+                        in self.__pending.items():
+                    cursor = conn.execute(
+                        'INSERT OR IGNORE INTO signatures '
+                        '(id, signature, numbers) VALUES (?, ?, ?)',
+                        (item_id, signature.tobytes(), digest)
+                    )
+                    if cursor.rowcount:
+                        conn.executemany(
+                            'INSERT INTO buckets (band, key, id) '
+                            'VALUES (?, ?, ?)',
+                            [(band, key, item_id)
+                             for band, key in enumerate(keys)]
+                        )
+                conn.executemany(
+                    'INSERT INTO counters (name, value) VALUES (?, ?) '
+                    'ON CONFLICT (name) DO UPDATE SET value = value + ?',
+                    [(name, value, value)
+                     for name, value in self.__pending_counts.items()]
+                )
+        logging.info(msg=f'dedup {self.db_path}: {self.__pending_counts}')
+        self.rollback()
+
+    def rollback(self):
+        """
+        Discard everything staged by `filter` since the last `commit`.
+        """
+        self.__pending = dict()
+        self.__pending_buckets = dict()
+        self.__pending_links = list()
+        self.__pending_counts = dict.fromkeys(COUNTERS, 0)
+
+    def report(self):
+        """
+        Get the deduplication totals of the collection.
+
+        Returns:
+            dict: Number of 'chunks' checked, 'embedded' chunks, 'skipped'
+                  and 'linked' near-duplicates, and 'avoided', the number of
+                  embeddings saved.
+        """
+        with self.__connect() as conn:
+            rows = conn.execute('SELECT name, value FROM counters')
+            report = dict.fromkeys(COUNTERS, 0)
+            report.update(dict(rows.fetchall()))
+
+        report['avoided'] = report['skipped'] + report['linked']
+        return report
@@ -0,0 +1,479 @@
+"""
+Ingestion Jobs - A module for running uploads in background worker processes.
+
+This module provides a SQLite-backed job queue for ingestion. The web process
+only submits jobs; local worker processes claim them, run `upload()` and record
+a checkpoint after every committed batch. A job interrupted by a crash or a
+restart is claimed again and resumes from its last checkpoint.
+
+Classes:
+    JobQueue: Persistent queue of ingestion jobs.
+
+Functions:
+    work(db_path): Run a worker loop that claims and processes jobs.
+    start_workers(num_workers, db_path): Start worker loops in background
+                                         processes.
+    supervise(processes, db_path): Restart worker processes that exited.
+
+Example Usage:
+    queue = JobQueue()
+    job_id = queue.submit(collection_name='database', file_path='data/a.pdf')
+    start_workers(num_workers=2)
+    print(queue.get(job_id))
+
+    Workers can also be run on their own:
+    python -m src.jobs --workers 2
+"""
+
+import os
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from uuid import uuid4
+from contextlib import contextmanager
+
+from .utils import load_yaml_file
+from .logger import logging
+
+cwd = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    collection_name TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    total INTEGER,
+    run_done INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    heartbeat_at REAL,
+    finished_at REAL
+)
+"""
+
+
+class JobQueue:
+    """
+    A persistent queue of ingestion jobs stored in SQLite.
+
+    A job moves from 'queued' to 'running' when a worker claims it and ends as
+    'done' or 'failed'. A failed run is queued again until it has been
+    attempted `max_attempts` times. A running job whose worker stopped sending
+    heartbeats for `lease` seconds is claimed again by another worker, within
+    the same limit.
+
+    Args:
+        db_path (str, optional): Path to the SQLite database
+                                 (default is `jobs_db` in config).
+        lease (int, optional): Seconds without a heartbeat after which a
+                               running job is considered abandoned
+                               (default is `job_lease` in config).
+        max_attempts (int, optional): Maximum number of runs per job
+                                      (default is `max_attempts` in config).
+    """
+
+    def __init__(self, db_path=None, lease=None, max_attempts=None):
+        config = load_yaml_file(filename=os.path.join(cwd, 'config.yaml'))
+        self.db_path = db_path or os.path.join(cwd, config['jobs_db'])
+        self.lease = config['job_lease'] if lease is None else lease
+        self.max_attempts = (config['max_attempts'] if max_attempts is None
+                             else max_attempts)
+
+        with self.__connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(SCHEMA)
+
+    @contextmanager
+    def __connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30,
+                               isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, collection_name, file_path):
+        """
+        Add an ingestion job to the queue.
+
+        Args:
+            collection_name (str): The collection to upload into.
+            file_path (str): The file to upload. It is removed once the job
+                             has finished successfully.
+
+        Returns:
+            str: The id of the new job.
+        """
+        job_id = str(uuid4())
+        with self.__connect() as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, collection_name, file_path, status, '
+                'created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, collection_name, file_path, 'queued', time.time())
+            )
+        logging.info(msg=f'Submitted job {job_id} for {file_path}')
+        return job_id
+
+    def claim(self, worker):
+        """
+        Claim the oldest queued or abandoned job.
+
+        Jobs that have already been run `max_attempts` times, including runs
+        whose worker died, are marked 'failed' instead of being claimed.
+
+        Args:
+            worker (str): Identifier of the claiming worker, as
+                          'hostname:pid'.
+
+        Returns:
+            dict: The claimed job, or None if there is nothing to do.
+        """
+        now = time.time()
+        with self.__connect() as conn:
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', finished_at = ?, "
+                    "error = COALESCE(error, ?) WHERE attempts >= ? AND "
+                    "(status = 'queued' OR "
+                    "(status = 'running' AND heartbeat_at < ?))",
+                    (now, f'Gave up after {self.max_attempts} attempts',
+                     self.max_attempts, now - self.lease)
+                )
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' OR "
+                    "(status = 'running' AND heartbeat_at < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now - self.lease,)
+                ).fetchone()
+
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, "
+                        "started_at = ?, heartbeat_at = ?, run_done = done, "
+                        "attempts = attempts + 1, error = NULL WHERE id = ?",
+                        (worker, now, now, row['id'])
+                    )
+                conn.execute('COMMIT')
+
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+        if row is None:
+            return None
+
+        logging.info(msg=f'{worker} claimed job {row["id"]} '
+                         f'at chunk {row["done"]}')
+        return self.get(row['id'])
+
+    def checkpoint(self, job_id, done, total=None):
+        """
+        Record progress of a running job and refresh its heartbeat.
+
+        Args:
+            job_id (str): The job to update.
+            done (int): Number of chunks committed so far.
+            total (int, optional): Total number of chunks in the file.
+        """
+        with self.__connect() as conn:
+            conn.execute(
+                'UPDATE jobs SET done = ?, total = COALESCE(?, total), '
+                'heartbeat_at = ? WHERE id = ?',
+                (done, total, time.time(), job_id)
+            )
+
+    def heartbeat(self, job_id, worker):
+        """
+        Refresh the heartbeat of a running job, so that it is not claimed by
+        another worker while it makes no checkpoint, e.g. while a large file
+        is parsed.
+
+        Args:
+            job_id (str): The job to update.
+            worker (str): The worker running the job. A job that has been
+                          claimed by another worker is left unchanged.
+        """
+        with self.__connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND "
+                "status = 'running' AND worker = ?",
+                (time.time(), job_id, worker)
+            )
+
+    def complete(self, job_id):
+        with self.__connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ? "
+                "WHERE id = ?",
+                (time.time(), job_id)
+            )
+
+    def fail(self, job_id, error):
+        """
+        Record a failed run. The job is queued again, resuming from its last
+        checkpoint, until it has used up `max_attempts`.
+
+        Args:
+            job_id (str): The job that failed.
+            error (str): Description of the failure.
+        """
+        with self.__connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts < ? "
+                "THEN 'queued' ELSE 'failed' END, error = ?, "
+                "finished_at = ? WHERE id = ?",
+                (self.max_attempts, str(error), time.time(), job_id)
+            )
+        logging.error(msg=f'Job {job_id} failed: {error}')
+
+    def recover(self):
+        """
+        Queue again the running jobs whose worker process on this host is no
+        longer alive, so they resume without waiting for the lease to expire.
+
+        Returns:
+            int: Number of recovered jobs.
+        """
+        host = socket.gethostname()
+        recovered = 0
+        with self.__connect() as conn:
+            rows = conn.execute(
+                "SELECT id, worker FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            for row in rows:
+                worker_host, _, pid = (row['worker'] or '').rpartition(':')
+                if worker_host == host and not _is_alive(int(pid or 0)):
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued' "
+                        "WHERE id = ? AND status = 'running'",
+                        (row['id'],)
+                    )
+                    recovered += 1
+
+        if recovered:
+            logging.info(msg=f'Recovered {recovered} interrupted jobs')
+        return recovered
+
+    def get(self, job_id):
+        """
+        Get a job with its progress, throughput and ETA.
+
+        Args:
+            job_id (str): The job to look up.
+
+        Returns:
+            dict: The job fields plus 'progress' (0 to 1), 'throughput'
+                  (chunks per second in the current run) and 'eta' (seconds
+                  left), or None if the job does not exist.
+        """
+        with self.__connect() as conn:
+            row = conn.execute('SELECT * FROM jobs WHERE id = ?',
+                               (job_id,)).fetchone()
+        return None if row is None else _with_stats(dict(row))
+
+    def list_jobs(self, limit=10):
+        """
+        List the most recently submitted jobs.
+
+        Args:
+            limit (int): Maximum number of jobs to return (default is 10).
+
+        Returns:
+            list: Jobs as returned by `get`, newest first.
+        """
+        with self.__connect() as conn:
+            rows = conn.execute(
+                'SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?',
+                (limit,)
+            ).fetchall()
+        return [_with_stats(dict(row)) for row in rows]
+
+
+def _is_alive(pid):
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _with_stats(job):
+    total = job['total']
+    done = job['done']
+    job['progress'] = done / total if total else 0.0
+    job['throughput'] = None
+    job['eta'] = None
+
+    if job['status'] == 'running' and job['started_at'] is not None:
+        elapsed = job['heartbeat_at'] - job['started_at']
+        if elapsed > 0 and done > job['run_done']:
+            job['throughput'] = (done - job['run_done']) / elapsed
+            if total:
+                job['eta'] = (total - done) / job['throughput']
+    return job
+
+
+def _keep_alive(queue, job, stop):
+    interval = max(queue.lease / 3, 1.0)
+    while True:
+        queue.heartbeat(job['id'], job['worker'])
+        if stop.wait(interval):
+            return
+
+
+def run_job(queue, client, job):
+    """
+    Run a claimed job from its last checkpoint.
+
+    The job's heartbeat is refreshed in the background for the whole run,
+    including parsing, which makes no checkpoint.
+
+    Args:
+        queue (JobQueue): The queue the job was claimed from.
+        client (ChromaDBClient): Client used for the upload.
+        job (dict): The claimed job.
+    """
+    from .main import upload
+
+    stop = threading.Event()
+    beat = threading.Thread(target=_keep_alive, args=(queue, job, stop),
+                            daemon=True)
+    beat.start()
+    try:
+        result = upload(
+            client=client,
+            collection_name=job['collection_name'],
+            file_path=job['file_path'],
+            start_at=job['done'],
+            on_batch=lambda done, total: queue.checkpoint(
+                job['id'], done, total
+                )
+        )
+
+    except Exception as e:
+        queue.fail(job['id'], e)
+        return
+
+    finally:
+        stop.set()
+        beat.join()
+
+    if result is None:
+        queue.fail(job['id'], 'Upload failed, see logs/client.log')
+        return
+
+    queue.complete(job['id'])
+    if os.path.exists(job['file_path']):
+        os.remove(job['file_path'])
+    logging.info(msg=f'Job {job["id"]} done: {result[1]} chunks')
+
+
+def work(db_path=None, poll_interval=1.0):
+    """
+    Claim and process jobs until the process is stopped.
+
+    Args:
+        db_path (str, optional): Path to the job database.
+        poll_interval (float): Seconds to wait when the queue is empty.
+    """
+    from .client import ChromaDBClient
+
+    queue = JobQueue(db_path=db_path)
+    client = ChromaDBClient(openai_api_key=os.getenv('OPENAI_API_KEY'),
+                            host=os.getenv('HOST'),
+                            port=os.getenv('PORT'))
+    worker = f'{socket.gethostname()}:{os.getpid()}'
+    logging.info(msg=f'Worker {worker} started')
+
+    while True:
+        job = queue.claim(worker)
+        if job is None:
+            time.sleep(poll_interval)
+            continue
+        run_job(queue=queue, client=client, job=job)
+
+
+def start_workers(num_workers=None, db_path=None, supervised=True):
+    """
+    Start worker loops in background processes.
+
+    Jobs left running by workers that died are queued again first.
+
+    Args:
+        num_workers (int, optional): Number of processes to start
+                                     (default is `num_workers` in config).
+        db_path (str, optional): Path to the job database.
+        supervised (bool): Restart workers that exit from a background
+                           thread, see `supervise` (default is True).
+
+    Returns:
+        list: The started processes.
+    """
+    if num_workers is None:
+        config = load_yaml_file(filename=os.path.join(cwd, 'config.yaml'))
+        num_workers = config['num_workers']
+
+    JobQueue(db_path=db_path).recover()
+
+    ctx = multiprocessing.get_context('spawn')
+    processes = [_start_worker(ctx, db_path) for _ in range(num_workers)]
+    if supervised:
+        threading.Thread(target=supervise, args=(processes, db_path),
+                         daemon=True).start()
+    return processes
+
+
+def _start_worker(ctx, db_path):
+    process = ctx.Process(target=work, args=(db_path,), daemon=True)
+    process.start()
+    return process
+
+
+def supervise(processes, db_path=None, interval=5.0):
+    """
+    Restart worker processes that exited, e.g. killed while parsing a file,
+    until the calling process stops. The job a dead worker was running is
+    queued again and counts as one of its attempts.
+
+    Args:
+        processes (list): The worker processes, replaced in place.
+        db_path (str, optional): Path to the job database.
+        interval (float): Seconds between checks.
+    """
+    ctx = multiprocessing.get_context('spawn')
+    queue = JobQueue(db_path=db_path)
+    while True:
+        time.sleep(interval)
+        for i, process in enumerate(processes):
+            if process.is_alive():
+                continue
+            logging.error(msg=f'Worker {process.pid} exited with code '
+                              f'{process.exitcode}, restarting')
+            queue.recover()
+            processes[i] = _start_worker(ctx, db_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run ingestion workers.')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('--db', default=None, help='path to the job database')
+    args = parser.parse_args()
+
+    supervise(start_workers(num_workers=args.workers, db_path=args.db,
+                            supervised=False),
+              db_path=args.db)
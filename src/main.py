@@ -14,10 +14,19 @@ Args:
     file_path (str): The path to the data file to be uploaded to the database.
 
 Functions:
+    build_index(client, collection_name): Create a vector index over a
+                                          collection.
+    build_where(doc_ids, page_range): Build a metadata filter scoping
+                                      retrieval to documents and pages.
+    context_kwargs(config): Get the retriever arguments that pack chunks
+                            into the token budget.
+    answer(index, question): Answer a single question without chat history,
+                             timing retrieval and synthesis separately.
     get_response(client, message): Retrieve a response from ChromaDB based on
                                    the user's message.
     upload(client, file_path): Upload data from a file to the ChromaDB
                                database.
+    upload_buffer(client, buffer, file_name): Upload a PDF held in memory.
 
 Example Usage:
     client = ChromaDBClient(openai_api_key='your_openai_api_key')
@@ -31,31 +40,32 @@ Example Usage:
 
 import os
 import time
-import chromadb
 
-from llama_index.vector_stores import ChromaVectorStore
-from llama_index import VectorStoreIndex, ServiceContext
-
-from .utils import upsert, logger, load_conversation
+from .utils import upsert, logger, load_conversation, load_yaml_file
 from .logger import logging
+from .profiler import profiled
 
 cwd = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
 
 
-def get_response(client, collection_name, message):
+def build_index(client, collection_name, callback_manager=None):
     """
-    Retrieve a response from ChromaDB based on the user's message.
+    Create a vector index over a collection.
 
     Args:
         client (ChromaDBClient): An instance of the ChromaDBClient for
                                  database interaction.
-        message (str): The user's message for which a response is requested.
+        collection_name (str): The collection to index.
+        callback_manager (CallbackManager, optional): Receives the events of
+                                                      every query and LLM
+                                                      call on the index.
 
     Returns:
-        str: The response generated by ChromaDB.
+        VectorStoreIndex: The index backed by the collection.
     """
-    start = time.time()
-    conversation = load_conversation()
+    from llama_index.vector_stores import ChromaVectorStore
+    from llama_index import VectorStoreIndex, ServiceContext
+
     collection = client.get_collection(collection_name=collection_name)
 
     logging.info(
@@ -64,7 +74,8 @@ def get_response(client, collection_name, message):
 
     vector_store = ChromaVectorStore(chroma_collection=collection)
     service_context = ServiceContext.from_defaults(
-                                chunk_size=512, chunk_overlap=25
+                                chunk_size=512, chunk_overlap=25,
+                                callback_manager=callback_manager
                                 )
 
     index = VectorStoreIndex.from_vector_store(
@@ -73,7 +84,138 @@ def get_response(client, collection_name, message):
                         )
 
     logging.info('Created vector index')
-    chat_engine = index.as_chat_engine()
+    return index
+
+
+def build_where(doc_ids=None, page_range=None):
+    """
+    Build a Chroma metadata filter restricting retrieval to some documents
+    and pages.
+
+    Args:
+        doc_ids (list, optional): Source file names to search, matched
+                                  against the chunks' 'source'.
+        page_range (tuple, optional): First and last page to search. Either
+                                      end may be None to leave it open.
+
+    Returns:
+        dict: The `where` filter, or None to search the whole collection.
+    """
+    clauses = list()
+    if doc_ids:
+        clauses.append({'source': {'$in': list(doc_ids)}})
+
+    first, last = page_range or (None, None)
+    if first is not None:
+        clauses.append({'page': {'$gte': int(first)}})
+    if last is not None:
+        clauses.append({'page': {'$lte': int(last)}})
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def context_kwargs(config, where=None):
+    """
+    Get the retriever arguments that pack the retrieved chunks into the
+    configured token budget.
+
+    Args:
+        config (dict): The loaded config.yaml.
+        where (dict, optional): A Chroma metadata filter applied by the
+                                vector store query.
+
+    Returns:
+        dict: Keyword arguments for `as_query_engine` and `as_chat_engine`.
+    """
+    from .context import TokenBudgetPacker
+
+    packer = TokenBudgetPacker(
+        token_budget=config['context']['token_budget'],
+        chunk_overlap=config['chunk_overlap']
+        )
+    kwargs = {
+        'similarity_top_k': config['context']['similarity_top_k'],
+        'node_postprocessors': [packer],
+        }
+    if where is not None:
+        kwargs['vector_store_kwargs'] = {'where': where}
+    return kwargs
+
+
+def answer(index, question, where=None):
+    """
+    Answer a single question against an index, without chat history.
+
+    Args:
+        index (VectorStoreIndex): The index to query.
+        question (str): The question to answer.
+        where (dict, optional): A Chroma metadata filter, see `build_where`.
+
+    Returns:
+        dict: The 'response', the ids of the retrieved chunks as 'sources',
+              including every chunk of a merged one, and the 'latency' in
+              seconds of the 'retrieve' and
+              'synthesize' stages.
+    """
+    from llama_index import QueryBundle
+    from .context import chunk_ids
+
+    config = load_yaml_file(filename=os.path.join(cwd, 'config.yaml'))
+    query_engine = index.as_query_engine(**context_kwargs(config, where))
+    query_bundle = QueryBundle(query_str=question)
+
+    start = time.time()
+    nodes = query_engine.retrieve(query_bundle)
+    retrieved = time.time()
+    response = query_engine.synthesize(query_bundle, nodes)
+    end = time.time()
+
+    return {
+            'response': response.response,
+            'sources': [i for n in nodes for i in chunk_ids(n.node)],
+            'latency': {
+                'retrieve': retrieved - start,
+                'synthesize': end - retrieved,
+                },
+            }
+
+
+@profiled('chat')
+def get_response(client, collection_name, message, doc_ids=None,
+                 page_range=None):
+    """
+    Retrieve a response from ChromaDB based on the user's message.
+
+    Args:
+        client (ChromaDBClient): An instance of the ChromaDBClient for
+                                 database interaction.
+        message (str): The user's message for which a response is requested.
+        doc_ids (list, optional): Only search chunks of these documents.
+        page_range (tuple, optional): Only search chunks within this first
+                                      and last page.
+
+    Returns:
+        dict: The 'response', the number of 'llm_calls' made to answer it and
+              the 'llm_latencies' in seconds of each call.
+    """
+    from llama_index.callbacks import CallbackManager
+    from llama_index.chat_engine.types import ChatMode
+    from .metrics import LLMCallTracker
+
+    start = time.time()
+    conversation = load_conversation()
+    tracker = LLMCallTracker()
+    index = build_index(client=client, collection_name=collection_name,
+                        callback_manager=CallbackManager([tracker]))
+
+    config = load_yaml_file(filename=os.path.join(cwd, 'config.yaml'))
+    where = build_where(doc_ids=doc_ids, page_range=page_range)
+    chat_engine = index.as_chat_engine(
+                            chat_mode=ChatMode(config['chat_mode']),
+                            **context_kwargs(config, where)
+                        )
     logger(message=message, role='user')
 
     agent_response = chat_engine.chat(
@@ -84,13 +226,56 @@ def get_response(client, collection_name, message):
     logger(message=agent_response.response, role='assistant')
 
     dur = (end - start)
-    logging.info(msg=f'Response time: {dur}')
+    logging.info(msg=f'Response time: {dur}, '
+                     f'{tracker.calls} LLM calls: {tracker.latencies}')
     return {
             'response': agent_response.response,
+            'llm_calls': tracker.calls,
+            'llm_latencies': tracker.latencies,
             }
 
 
-def upload(client, collection_name, file_path):
+def _ingest(client, collection_name, nodes, start_at=0, on_batch=None):
+    import chromadb
+    from .dedup import ChunkDeduplicator
+    from .registry import DocumentRegistry
+
+    start = time.time()
+    collection = client.get_collection(collection_name)
+    logging.info(msg=f'Loaded collection {collection_name}')
+    if collection is None or nodes is None:
+        return None
+
+    dedup = None
+    if client.config['dedup']['enabled']:
+        dedup = ChunkDeduplicator(collection_id=collection.id)
+
+    result = upsert(collection=collection, nodes=nodes,
+                    start_at=start_at, on_batch=on_batch, dedup=dedup)
+    if dedup is not None:
+        logging.info(msg=f'Dedup report {collection_name}: '
+                         f'{dedup.report()}')
+    if result is not None:
+        # Files whose chunks were all skipped as near-duplicates have nothing
+        # to search, so they are not offered as documents.
+        sources = {n.metadata.get('file_name', 'unknown') for n in nodes}
+        DocumentRegistry().add(collection.id, [
+            source for source in sources
+            if collection.get(where={'source': source}, limit=1,
+                              include=[])['ids']
+            ])
+
+    storage_path = os.path.join(cwd, 'storage')
+    chromadb.PersistentClient(path=storage_path)
+    end = time.time()
+
+    dur = end - start
+    logging.info(msg=f'Execution time: {dur}')
+    return result
+
+
+@profiled('upload')
+def upload(client, collection_name, file_path, start_at=0, on_batch=None):
     """
     Upload data from a file to the ChromaDB database.
 
@@ -99,18 +284,40 @@ def upload(client, collection_name, file_path):
                                  database interaction.
         file_path (str): The path to the data file to be uploaded to the
                          database.
+        start_at (int, optional): Index of the first chunk to upload, used
+                                  to resume an interrupted upload.
+        on_batch (callable, optional): Called as `on_batch(done, total)`
+                                       after every committed batch.
     Returns:
-        None
+        tuple: The upsert execution time and the number of chunks, or None
+               if the upload failed.
     """
-    start = time.time()
-    collection = client.get_collection(collection_name)
-    logging.info(msg=f'Loaded collection {collection_name}')
     nodes = client.load(file_path)
-    upsert(collection=collection, nodes=nodes)
+    return _ingest(client=client, collection_name=collection_name,
+                   nodes=nodes, start_at=start_at, on_batch=on_batch)
 
-    storage_path = os.path.join(cwd, 'storage')
-    chromadb.PersistentClient(path=storage_path)
-    end = time.time()
 
-    dur = end - start
-    logging.info(msg=f'Execution time: {dur}')
+@profiled('upload')
+def upload_buffer(client, collection_name, buffer, file_name, start_at=0,
+                  on_batch=None):
+    """
+    Upload a PDF held in memory to the ChromaDB database, parsing it in
+    place instead of writing it to disk first.
+
+    Args:
+        client (ChromaDBClient): An instance of the ChromaDBClient for
+                                 database interaction.
+        buffer (file-like or bytes): The PDF content, e.g. a Streamlit
+                                     upload.
+        file_name (str): The name of the uploaded file.
+        start_at (int, optional): Index of the first chunk to upload, used
+                                  to resume an interrupted upload.
+        on_batch (callable, optional): Called as `on_batch(done, total)`
+                                       after every committed batch.
+    Returns:
+        tuple: The upsert execution time and the number of chunks, or None
+               if the upload failed.
+    """
+    nodes = client.load_buffer(buffer=buffer, file_name=file_name)
+    return _ingest(client=client, collection_name=collection_name,
+                   nodes=nodes, start_at=start_at, on_batch=on_batch)
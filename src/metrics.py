@@ -0,0 +1,81 @@
+"""
+LLM Metrics - A module for counting and timing the LLM calls of a request.
+
+Classes:
+    LLMCallTracker: Callback handler recording the latency of every LLM call.
+
+Example Usage:
+    tracker = LLMCallTracker()
+    service_context = ServiceContext.from_defaults(
+        callback_manager=CallbackManager([tracker])
+        )
+    ...
+    print(tracker.calls, tracker.latencies)
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+from llama_index.callbacks.base_handler import BaseCallbackHandler
+from llama_index.callbacks.schema import CBEventType
+
+
+class LLMCallTracker(BaseCallbackHandler):
+    """
+    A callback handler that records the latency of every LLM round trip.
+
+    A chat call implemented on top of a completion call emits two nested LLM
+    events; only the outer one is counted. Use one tracker per request.
+
+    Attributes:
+        latencies (list): Seconds taken by each LLM call, in call order.
+    """
+
+    def __init__(self):
+        super().__init__(event_starts_to_ignore=[], event_ends_to_ignore=[])
+        self.latencies = list()
+        self.__open = dict()
+        self.__nested = set()
+
+    @property
+    def calls(self):
+        return len(self.latencies)
+
+    def on_event_start(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = '',
+        parent_id: str = '',
+        **kwargs: Any,
+    ) -> str:
+        if event_type == CBEventType.LLM:
+            if self.__open:
+                self.__nested.add(event_id)
+            else:
+                self.__open[event_id] = time.time()
+        return event_id
+
+    def on_event_end(
+        self,
+        event_type: CBEventType,
+        payload: Optional[Dict[str, Any]] = None,
+        event_id: str = '',
+        **kwargs: Any,
+    ) -> None:
+        if event_type != CBEventType.LLM:
+            return
+        if event_id in self.__nested:
+            self.__nested.discard(event_id)
+        elif event_id in self.__open:
+            self.latencies.append(time.time() - self.__open.pop(event_id))
+
+    def start_trace(self, trace_id: Optional[str] = None) -> None:
+        pass
+
+    def end_trace(
+        self,
+        trace_id: Optional[str] = None,
+        trace_map: Optional[Dict[str, List[str]]] = None,
+    ) -> None:
+        pass
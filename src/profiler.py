@@ -0,0 +1,265 @@
+"""
+Request Profiler - A module for capturing opt-in profiles of slow requests.
+
+Functions wrapped with `profiled` run under cProfile and tracemalloc when
+profiling is switched on for that call. Each capture is written to the
+profiles directory as `<kind>-<request_id>.prof`, the raw cProfile stats, and
+`<kind>-<request_id>.json`, a summary with the top hotspots and allocation
+sites and the peak traced memory. The peak is left out (null) for a capture
+that started while another one was running, since it cannot be told apart.
+
+Profiling is decided per call, in this order:
+    1. The DOCGPT_PROFILE environment variable: '1' always profiles, '0'
+       never does.
+    2. `profiling.enabled` in config.yaml always profiles.
+    3. `profiling.sample_rate` in config.yaml profiles that fraction of calls.
+
+Functions:
+    profiled(kind): Decorator that profiles the calls selected for capture.
+    aggregate(paths, top_n): Merge many captures into one report.
+
+Example Usage:
+    DOCGPT_PROFILE=1 streamlit run app.py
+    python -m src.profiler profiles --kind chat --top 30
+"""
+
+import os
+import io
+import json
+import glob
+import time
+import pstats
+import random
+import argparse
+import cProfile
+import functools
+import threading
+import tracemalloc
+from uuid import uuid4
+
+from .utils import load_yaml_file
+from .logger import logging
+
+cwd = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+
+# tracemalloc is process-wide, so it is shared by overlapping captures: it is
+# started by the first one and stopped when the last one ends.
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_owns_tracing = False
+
+
+def should_profile(config):
+    """
+    Decide whether the current call is profiled.
+
+    Args:
+        config (dict): The `profiling` section of config.yaml.
+
+    Returns:
+        bool: True if the call should be profiled.
+    """
+    env = os.getenv('DOCGPT_PROFILE')
+    if env in ('0', '1'):
+        return env == '1'
+    if config['enabled']:
+        return True
+    return random.random() < config['sample_rate']
+
+
+def _start_tracing():
+    """
+    Start tracing memory allocations for one capture.
+
+    Returns:
+        bool: True if no other capture is running, so the traced peak can be
+              reset and belongs to this capture alone.
+    """
+    global _tracing_users, _owns_tracing
+    with _tracing_lock:
+        if _tracing_users == 0:
+            _owns_tracing = not tracemalloc.is_tracing()
+            if _owns_tracing:
+                tracemalloc.start()
+        _tracing_users += 1
+        sole = _tracing_users == 1
+        if sole:
+            tracemalloc.reset_peak()
+        return sole
+
+
+def _stop_tracing():
+    global _tracing_users
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _owns_tracing:
+            tracemalloc.stop()
+
+
+def hotspots(stats, top_n):
+    """
+    Get the functions with the highest cumulative time.
+
+    Args:
+        stats (pstats.Stats): The profile statistics.
+        top_n (int): Number of functions to return.
+
+    Returns:
+        list: Dictionaries with 'function', 'ncalls', 'tottime' and
+              'cumtime', slowest first.
+    """
+    rows = list()
+    for (filename, line, name), (_, ncalls, tottime, cumtime, _) in \
+            stats.stats.items():
+        rows.append({
+            'function': f'{filename}:{line}({name})',
+            'ncalls': ncalls,
+            'tottime': tottime,
+            'cumtime': cumtime,
+        })
+    rows.sort(key=lambda r: r['cumtime'], reverse=True)
+    return rows[:top_n]
+
+
+def _write(config, kind, request_id, profile, snapshot, peak, dur):
+    profile_dir = os.path.join(cwd, config['dir'])
+    os.makedirs(profile_dir, exist_ok=True)
+    base = os.path.join(profile_dir, f'{kind}-{request_id}')
+
+    profile.dump_stats(f'{base}.prof')
+    stats = pstats.Stats(profile, stream=io.StringIO())
+
+    allocations = list()
+    for stat in snapshot.statistics('lineno')[:config['top_n']]:
+        frame = stat.traceback[0]
+        allocations.append({
+            'location': f'{frame.filename}:{frame.lineno}',
+            'size': stat.size,
+            'count': stat.count,
+        })
+
+    summary = {
+        'request_id': request_id,
+        'kind': kind,
+        'timestamp': time.time(),
+        'duration': dur,
+        'peak_memory': peak,
+        'hotspots': hotspots(stats, config['top_n']),
+        'allocations': allocations,
+    }
+    with open(f'{base}.json', 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    return base
+
+
+def profiled(kind):
+    """
+    Profile the calls of the decorated function that are selected for
+    capture.
+
+    Args:
+        kind (str): Name of the request type, used in file names, e.g.
+                    'upload' or 'chat'.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            config = load_yaml_file(
+                filename=os.path.join(cwd, 'config.yaml')
+                )['profiling']
+            if not should_profile(config):
+                return func(*args, **kwargs)
+
+            request_id = str(uuid4())
+            sole = _start_tracing()
+
+            profile = cProfile.Profile()
+            start = time.time()
+            try:
+                return profile.runcall(func, *args, **kwargs)
+
+            finally:
+                dur = time.time() - start
+                try:
+                    snapshot = tracemalloc.take_snapshot()
+                    # The peak of a capture that overlapped an earlier one
+                    # may predate it, so it is not reported.
+                    peak = tracemalloc.get_traced_memory()[1] if sole \
+                        else None
+                    path = _write(config, kind, request_id, profile,
+                                  snapshot, peak, dur)
+                    logging.info(msg=f'Profiled {kind} {request_id}: '
+                                     f'{dur} seconds, peak {peak} bytes, '
+                                     f'written to {path}')
+                except Exception as e:
+                    logging.error(msg=f'Profiler error: {e}')
+                finally:
+                    _stop_tracing()
+
+        return wrapper
+    return decorator
+
+
+def aggregate(paths, top_n=20):
+    """
+    Merge many captures into one report.
+
+    Args:
+        paths (list): The `.prof` files to merge. The matching `.json`
+                      summaries are used for durations and memory peaks.
+        top_n (int): Number of hotspots to report (default is 20).
+
+    Returns:
+        dict: Number of 'captures', 'duration' and 'peak_memory' as mean and
+              max, and the merged 'hotspots'.
+    """
+    if not paths:
+        return {'captures': 0}
+
+    stats = pstats.Stats(paths[0], stream=io.StringIO())
+    for path in paths[1:]:
+        stats.add(path)
+
+    durations = list()
+    peaks = list()
+    for path in paths:
+        summary_path = os.path.splitext(path)[0] + '.json'
+        if os.path.exists(summary_path):
+            with open(summary_path, 'r') as f:
+                summary = json.load(f)
+            durations.append(summary['duration'])
+            if summary['peak_memory'] is not None:
+                peaks.append(summary['peak_memory'])
+
+    def describe(values):
+        if not values:
+            return None
+        return {'mean': sum(values) / len(values), 'max': max(values)}
+
+    return {
+        'captures': len(paths),
+        'duration': describe(durations),
+        'peak_memory': describe(peaks),
+        'hotspots': hotspots(stats, top_n),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Aggregate profiler captures.'
+        )
+    parser.add_argument('directory', nargs='?',
+                        default=os.path.join(cwd, 'profiles'))
+    parser.add_argument('--kind', default='*',
+                        help="request type to include, e.g. 'chat'")
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(
+        os.path.join(args.directory, f'{args.kind}-*.prof')
+        ))
+    print(json.dumps(aggregate(paths, top_n=args.top), indent=2))
@@ -0,0 +1,105 @@
+"""
+Document Registry - A module for listing the documents of a collection
+without scanning it.
+
+Every successful upload or import records its source files in a small SQLite
+table keyed by the collection's id, so the list of documents to search is a
+single indexed query instead of a scan over the metadata of every chunk. Ids
+are unique per collection instance, so a collection deleted and created again
+under the same name starts with an empty list.
+
+Classes:
+    DocumentRegistry: Persistent list of the source files per collection.
+
+Example Usage:
+    registry = DocumentRegistry()
+    registry.add(collection.id, ['a.pdf'])
+    print(registry.list(collection.id))
+"""
+
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from .utils import load_yaml_file
+
+cwd = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    PRIMARY KEY (collection_id, source)
+)
+"""
+
+
+class DocumentRegistry:
+    """
+    A persistent list of the source files stored in each collection.
+
+    Args:
+        db_path (str, optional): Path to the SQLite database
+                                 (default is `documents_db` in config).
+    """
+
+    def __init__(self, db_path=None):
+        config = load_yaml_file(filename=os.path.join(cwd, 'config.yaml'))
+        self.db_path = db_path or os.path.join(cwd, config['documents_db'])
+
+        with self.__connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(SCHEMA)
+
+    @contextmanager
+    def __connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def add(self, collection_id, sources):
+        """
+        Record source files as stored in a collection.
+
+        Args:
+            collection_id (str): The id of the collection.
+            sources (iterable): The source file names.
+        """
+        with self.__connect() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO documents (collection_id, source) '
+                'VALUES (?, ?)',
+                [(str(collection_id), source) for source in set(sources)]
+            )
+
+    def list(self, collection_id):
+        """
+        List the source files of a collection.
+
+        Args:
+            collection_id (str): The id of the collection.
+
+        Returns:
+            list: The sorted source file names.
+        """
+        with self.__connect() as conn:
+            rows = conn.execute(
+                'SELECT source FROM documents WHERE collection_id = ? '
+                'ORDER BY source',
+                (str(collection_id),)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def drop(self, collection_id):
+        """
+        Forget every source file of a collection, e.g. once it is deleted.
+
+        Args:
+            collection_id (str): The id of the collection.
+        """
+        with self.__connect() as conn:
+            conn.execute('DELETE FROM documents WHERE collection_id = ?',
+                         (str(collection_id),))
@@ -3,22 +3,27 @@ import re
 import json
 import yaml
 import time
-import openai
-import PyPDF2
 from uuid import uuid4
 from datetime import datetime
 
-from llama_index.llms.base import ChatMessage
-from llama_index.llms.types import MessageRole
 from .logger import logging
 
 cwd = os.path.realpath(os.path.join(os.path.dirname(__file__), '..'))
 
+# Parsed YAML files keyed by path, stored with the file's modification time.
+_yaml_cache = dict()
+
+# API key validation results keyed by key, stored with the time of the check.
+_api_key_cache = dict()
+
 
 def load_yaml_file(filename):
     """
     Load data from a YAML file.
 
+    The parsed data is cached for the lifetime of the process and reloaded
+    only when the file's modification time changes.
+
     Args:
     filename (str): The path to the YAML file.
 
@@ -26,9 +31,15 @@ def load_yaml_file(filename):
     dict: The data loaded from the YAML file.
     """
     try:
+        mtime = os.path.getmtime(filename)
+        cached = _yaml_cache.get(filename)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
         with open(filename, 'r') as file:
             data = yaml.safe_load(file)
 
+        _yaml_cache[filename] = (mtime, data)
         return data
 
     except Exception as e:
@@ -48,7 +59,7 @@ def save_uploaded_file(uploadedfile):
 
             f.write(uploadedfile.getbuffer())
 
-        return os.path.join(cwd, 'data', uploadedfile.name)
+        return os.path.join(cwd, config['data_dir'], uploadedfile.name)
 
     except Exception as e:
         logging.error(f'Save uploade file: {e}')
@@ -67,6 +78,8 @@ def extract_text_from_pdf(pdf_file_path):
               numbers.
             Each dictionary has two keys: 'Page_No' and 'Page_Text'.
     """
+    import PyPDF2
+
     try:
         start = time.time()
         with open(pdf_file_path, 'rb') as pdf_file:
@@ -139,6 +152,9 @@ def logger(message, role):
 
 
 def load_conversation():
+    from llama_index.llms.base import ChatMessage
+    from llama_index.llms.types import MessageRole
+
     try:
         config = load_yaml_file(filename=os.path.join(cwd, 'config.yaml'))
         top_n = config['top_n']
@@ -182,49 +198,172 @@ def load_conversation():
         return None
 
 
-def upsert(collection, nodes):
+def count_tokens(text):
+    """
+    Count the tokens of a text with the tokenizer used to split chunks.
+
+    Args:
+        text (str): The text to count.
+
+    Returns:
+        int: The number of tokens.
+    """
+    from llama_index.utils import get_tokenizer
+
+    return len(get_tokenizer()(text))
+
+
+def upsert(collection, nodes, batch_size=None, start_at=0, on_batch=None,
+           dedup=None):
     """
     Upsert (insert or update) text data into a collection.
 
+    Nodes are written in batches of `batch_size`. Ids are the node content
+    hashes, so replaying a batch after a failure overwrites rather than
+    duplicates it. Each chunk's metadata records its source file as
+    'source', its page label and, for numeric labels, its page number as
+    'page', which can be filtered on. It also records the chunk's token count
+    and position in the document, used to pack the context at query time.
+    Near-duplicates linked by `dedup` are stored with the embedding of the
+    chunk they duplicate and its id as 'duplicate_of'.
+
     Args:
         collection (chromadb.Collection): The ChromaDB collection to upsert
         data into.
-        text (list): A list of dictionaries containing text data to upsert.
+        nodes (list): A list of llama_index nodes to upsert.
+        batch_size (int, optional): Number of nodes per upsert call
+                                    (default is `batch_size` in config).
+        start_at (int, optional): Index of the first node to write, used to
+                                  resume from a checkpoint (default is 0).
+        on_batch (callable, optional): Called as `on_batch(done, total)`
+                                       after every committed batch.
+        dedup (ChunkDeduplicator, optional): Filter that drops near-duplicate
+                                             nodes before they are embedded.
 
     Returns:
-        None
+        tuple: The execution time and the number of nodes.
     """
     try:
         start = time.time()
-        for node in nodes:
-            hash = node.hash
-            content = node.text
-            page_number = node.metadata['page_label']
-
-            if content != '':
-                content_metadata = {
-                    'id': hash,
-                    'Page_No': page_number,
-                    'Page_Text': content
-                }
-
-                collection.add(
-                    documents=[content],
-                    metadatas=[content_metadata],
-                    ids=[str(id)]
+        if batch_size is None:
+            config = load_yaml_file(
+                filename=os.path.join(cwd, 'config.yaml')
+                )
+            batch_size = config['batch_size']
+
+        total = len(nodes)
+        for i in range(start_at, total, batch_size):
+            positions = {id(n): i + k
+                         for k, n in enumerate(nodes[i:i + batch_size])
+                         if n.text != ''}
+            batch_nodes = [n for n in nodes[i:i + batch_size]
+                           if id(n) in positions]
+            links = list()
+            if dedup is not None:
+                batch_nodes = dedup.filter(batch_nodes)
+                links = dedup.links()
+
+            batch = {node.hash: (node.text,
+                                 _chunk_metadata(node, positions[id(node)]))
+                     for node in batch_nodes}
+            if batch:
+                collection.upsert(
+                    documents=[b[0] for b in batch.values()],
+                    metadatas=[b[1] for b in batch.values()],
+                    ids=list(batch.keys())
                 )
+            if links:
+                _upsert_links(collection, links, positions)
+            if dedup is not None:
+                dedup.commit()
+
+            if on_batch is not None:
+                on_batch(min(i + batch_size, total), total)
         end = time.time()
 
         dur = end - start
-        return dur, len(nodes)
+        return dur, total
 
     except Exception as e:
         logging.error(f'Upsert Error: {e}')
         return None
 
 
-def is_api_key_valid():
-    openai.api_key = os.getenv('OPENAI_API_KEY')
+def _chunk_metadata(node, position):
+    page_label = node.metadata['page_label']
+    metadata = {
+        'id': node.hash,
+        'source': node.metadata.get('file_name', 'unknown'),
+        'Page_No': page_label,
+        'tokens': count_tokens(node.text),
+        'chunk': position
+    }
+    if page_label.isdigit():
+        metadata['page'] = int(page_label)
+    return metadata
+
+
+def _upsert_links(collection, links, positions):
+    stored = collection.get(ids=list({match for _, match in links}),
+                            include=['embeddings'])
+    embeddings = dict(zip(stored['ids'], stored['embeddings']))
+
+    batch = dict()
+    for node, match in links:
+        if match not in embeddings:
+            logging.warning(f'Duplicate of missing chunk {match} skipped')
+            continue
+        metadata = _chunk_metadata(node, positions[id(node)])
+        metadata['duplicate_of'] = match
+        batch[node.hash] = (node.text, metadata, embeddings[match])
+
+    if batch:
+        collection.upsert(
+            documents=[b[0] for b in batch.values()],
+            metadatas=[b[1] for b in batch.values()],
+            embeddings=[b[2] for b in batch.values()],
+            ids=list(batch.keys())
+        )
+
+
+def is_api_key_valid(ttl=None):
+    """
+    Check that the OpenAI API key works.
+
+    A working key or a rejected one is cached per key for `ttl` seconds, so
+    repeated checks do not each make a paid API call. A check that fails for
+    another reason, e.g. a network error or a rate limit, is not cached and
+    the key is reported as not working until a later check succeeds.
+
+    Args:
+        ttl (int, optional): Seconds to reuse a previous result
+                             (default is `cache_ttl` in config).
+
+    Returns:
+        bool: True if the key is valid.
+    """
+    api_key = os.getenv('OPENAI_API_KEY')
+    if ttl is None:
+        config = load_yaml_file(filename=os.path.join(cwd, 'config.yaml'))
+        ttl = config['cache_ttl']
+
+    cached = _api_key_cache.get(api_key)
+    if cached is not None and time.time() - cached[1] < ttl:
+        return cached[0]
+
+    status = _check_api_key(api_key)
+    if status is None:
+        return False
+    _api_key_cache[api_key] = (status, time.time())
+    return status
+
+
+def _check_api_key(api_key):
+    # True or False if the key is known to work or not, None if the check
+    # could not tell.
+    import openai
+
+    openai.api_key = api_key
 
     try:
         openai.chat.completions.create(
@@ -238,7 +377,14 @@ def is_api_key_valid():
                 temperature=0,
         )
 
-    except ValueError:
+    except (openai.AuthenticationError, openai.PermissionDeniedError):
+        return False
+
+    except openai.APIError as e:
+        logging.warning(f'API key check failed: {e}')
+        return None
+
+    except (ValueError, openai.OpenAIError):
         return False
 
     else:
@@ -0,0 +1,50 @@
+import os
+import json
+import tempfile
+import unittest
+from unittest.mock import patch
+from src import batch
+
+
+def fake_answer(index, question):
+    if question == 'fail':
+        raise ValueError('boom')
+    return {'response': question.upper(),
+            'sources': ['a'],
+            'latency': {'retrieve': 0.1, 'synthesize': 0.2}}
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.input = os.path.join(self.tmp.name, 'questions.jsonl')
+        self.output = os.path.join(self.tmp.name, 'answers.jsonl')
+        with open(self.input, 'w') as f:
+            for i, q in enumerate(['one', 'fail', 'three']):
+                f.write(json.dumps({'id': i, 'question': q}) + '\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    @patch('src.batch.build_index')
+    @patch('src.batch.answer', side_effect=fake_answer)
+    def test_run_and_resume(self, answer, build_index):
+        summary = batch.run(None, 'database', self.input, self.output,
+                            workers=2)
+        self.assertEqual(summary['answered'], 2)
+        self.assertEqual(summary['failed'], 1)
+        self.assertEqual(batch.load_answered(self.output), {'0', '2'})
+
+        answer.reset_mock()
+        summary = batch.run(None, 'database', self.input, self.output)
+        self.assertEqual(answer.call_count, 1)
+        self.assertEqual(summary['failed'], 1)
+
+    def test_percentile(self):
+        self.assertEqual(batch.percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertEqual(batch.percentile([1, 2], 100), 2)
+        self.assertIsNone(batch.percentile([], 90))
+
+
+if __name__ == '__main__':
+    unittest.main()
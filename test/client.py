@@ -1,7 +1,15 @@
+import io
 import os
+import tempfile
 import unittest
-from unittest.mock import MagicMock
+import chromadb
+from unittest.mock import MagicMock, patch
+from PyPDF2 import PdfWriter
+from PyPDF2.generic import (
+    ArrayObject, DictionaryObject, NameObject, NumberObject
+    )
 from src.client import ChromaDBClient
+from src.dedup import ChunkDeduplicator
 from src.utils import load_yaml_file
 
 conf = load_yaml_file(filename=os.path.join(os.path.dirname(__file__),
@@ -14,6 +22,18 @@ class TestChromaDBClient(unittest.TestCase):
         self.client = ChromaDBClient(
             openai_api_key=os.getenv('OPENAI_API_KEY')
             )
+        self.tmp = tempfile.TemporaryDirectory()
+        registry_db = patch('src.registry.load_yaml_file', return_value={
+            'documents_db': os.path.join(self.tmp.name, 'documents.db')
+            })
+        registry_db.start()
+        self.addCleanup(registry_db.stop)
+        dedup_dir = patch('src.dedup.load_yaml_file', return_value={
+            'dedup': dict(conf['dedup'], dir=self.tmp.name)
+            })
+        dedup_dir.start()
+        self.addCleanup(dedup_dir.stop)
+        self.addCleanup(self.tmp.cleanup)
 
     def test_initialize_client(self):
         self.assertIsNotNone(self.client)
@@ -25,6 +45,151 @@ class TestChromaDBClient(unittest.TestCase):
         collection = self.client.get_collection(conf['collection_name'])
         self.assertEqual(collection, conf['collection_name'])
 
+    def test_scan_pages_without_embeddings(self):
+        collection = MagicMock()
+        collection.get.side_effect = [
+            {'ids': ['a', 'b'], 'metadatas': [{'Page_No': '1'}] * 2},
+            {'ids': ['c'], 'metadatas': [{'Page_No': '2'}]},
+        ]
+        self.client.client = MagicMock()
+        self.client.client.get_collection.return_value = collection
+
+        items = list(self.client.scan(conf['collection_name'], page_size=2))
+        self.assertEqual([i['id'] for i in items], ['a', 'b', 'c'])
+        self.assertEqual(items[2]['metadata'], {'Page_No': '2'})
+        for call in collection.get.call_args_list:
+            self.assertNotIn('embeddings', call.kwargs['include'])
+
+    def test_get_stats(self):
+        collection = MagicMock()
+        collection.get.return_value = {
+            'ids': ['a', 'b', 'c'],
+            'metadatas': [{'source': 'x.pdf', 'Page_No': '1'},
+                          {'source': 'x.pdf', 'Page_No': '2'},
+                          {'source': 'y.pdf', 'Page_No': '1'}],
+            'documents': ['aaaa', 'bb', 'cccccc'],
+        }
+        self.client.client = MagicMock()
+        self.client.client.get_collection.return_value = collection
+
+        stats = self.client.get_stats(conf['collection_name'])
+        self.assertEqual(stats['count'], 3)
+        self.assertEqual(stats['sources'], {'x.pdf': 2, 'y.pdf': 1})
+        self.assertEqual(stats['pages']['x.pdf'], {'1': 1, '2': 1})
+        self.assertEqual(stats['avg_chunk_length'], 4)
+
+    def test_export_import_round_trip(self):
+        self.client.client = chromadb.EphemeralClient()
+        self.client.config = dict(
+            self.client.config,
+            dedup=dict(self.client.config['dedup'], enabled=True)
+            )
+        source = self.client.client.get_or_create_collection(
+            'export-source', metadata={'hnsw:space': 'cosine'}
+            )
+        source.upsert(ids=[str(i) for i in range(25)],
+                      embeddings=[[float(i), 1.0] for i in range(25)],
+                      metadatas=[{'source': 'a.pdf', 'page': i}
+                                 for i in range(25)],
+                      documents=[f'chunk {i}' for i in range(25)])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            file_path = os.path.join(tmp, 'export.parquet')
+            self.assertEqual(self.client.export_collection(
+                'export-source', file_path, page_size=10), 25)
+            self.assertEqual(self.client.import_collection(
+                'export-target', file_path, batch_size=7), 25)
+
+        target = self.client.client.get_collection('export-target')
+        self.assertEqual(target.metadata, {'hnsw:space': 'cosine'})
+        item = target.get(ids=['3'],
+                          include=['embeddings', 'metadatas', 'documents'])
+        self.assertEqual(item['embeddings'], [[3.0, 1.0]])
+        self.assertEqual(item['metadatas'], [{'source': 'a.pdf', 'page': 3}])
+        self.assertEqual(item['documents'], ['chunk 3'])
+        self.assertEqual(self.client.get_documents('export-target'),
+                         ['a.pdf'])
+        self.assertTrue(os.path.exists(
+            os.path.join(self.tmp.name, f'{target.id}.db')))
+
+    def test_get_documents_registers_scanned_sources(self):
+        self.client.client = chromadb.EphemeralClient()
+        collection = self.client.client.get_or_create_collection('documents')
+        collection.upsert(ids=['1', '2', '3'],
+                          embeddings=[[1.0, 0.0]] * 3,
+                          metadatas=[{'source': 'b.pdf'}, {'source': 'a.pdf'},
+                                     {'source': 'b.pdf'}])
+        self.assertEqual(self.client.get_documents('documents'),
+                         ['a.pdf', 'b.pdf'])
+
+        with patch.object(self.client, 'scan') as scan:
+            self.assertEqual(self.client.get_documents('documents'),
+                             ['a.pdf', 'b.pdf'])
+            scan.assert_not_called()
+
+        collection_id = collection.id
+        ChunkDeduplicator(collection_id=collection_id)
+        self.client.delete_collection('documents')
+        self.client.client.get_or_create_collection('documents')
+        self.assertEqual(self.client.get_documents('documents'), [])
+        self.assertFalse(os.path.exists(
+            os.path.join(self.tmp.name, f'{collection_id}.db')))
+
+    def test_failed_export_leaves_no_file(self):
+        collection = MagicMock()
+        collection.count.return_value = 4
+        collection.metadata = None
+        collection.get.side_effect = [
+            {'ids': ['a', 'b'], 'documents': ['x', 'y'],
+             'metadatas': [{}, {}], 'embeddings': [[1.0], [2.0]]},
+            RuntimeError('connection reset'),
+        ]
+        self.client.client = MagicMock()
+        self.client.client.get_collection.return_value = collection
+
+        file_path = os.path.join(self.tmp.name, 'export.parquet')
+        self.assertIsNone(self.client.export_collection(
+            conf['collection_name'], file_path, page_size=2))
+        self.assertEqual(os.listdir(self.tmp.name), [])
+        self.assertIsNone(self.client.get_stats(conf['collection_name']))
+
+    def test_load_buffer_from_memory(self):
+        writer = PdfWriter()
+        writer.add_blank_page(width=100, height=100)
+        writer.add_blank_page(width=100, height=100)
+        stream = io.BytesIO()
+        writer.write(stream)
+
+        for buffer in (stream, memoryview(stream.getvalue())):
+            nodes = self.client.load_buffer(buffer, file_name='a.pdf')
+            self.assertEqual([n.metadata for n in nodes],
+                             [{'page_label': '1', 'file_name': 'a.pdf'},
+                              {'page_label': '2', 'file_name': 'a.pdf'}])
+
+    def test_file_and_buffer_share_page_labels(self):
+        writer = PdfWriter()
+        for _ in range(3):
+            writer.add_blank_page(width=100, height=100)
+        writer._root_object[NameObject('/PageLabels')] = DictionaryObject({
+            NameObject('/Nums'): ArrayObject([
+                NumberObject(0),
+                DictionaryObject({NameObject('/S'): NameObject('/r')}),
+                NumberObject(2),
+                DictionaryObject({NameObject('/S'): NameObject('/D')}),
+            ])
+        })
+        file_path = os.path.join(self.tmp.name, 'a.pdf')
+        with open(file_path, 'wb') as f:
+            writer.write(f)
+
+        with open(file_path, 'rb') as f:
+            from_buffer = self.client.load_buffer(f.read(), file_name='a.pdf')
+        from_file = self.client.load(file_path)
+        self.assertEqual([n.metadata['page_label'] for n in from_file],
+                         ['i', 'ii', '1'])
+        self.assertEqual([n.hash for n in from_file],
+                         [n.hash for n in from_buffer])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import chromadb
+from uuid import uuid4
+from llama_index.schema import MetadataMode, NodeWithScore, TextNode
+from llama_index.vector_stores import ChromaVectorStore
+from llama_index.vector_stores.types import VectorStoreQuery
+from src.context import TokenBudgetPacker, chunk_ids, merge_text
+
+
+def chunk(text, score, page='1', index=0, tokens=100, source='a.pdf'):
+    return NodeWithScore(
+        node=TextNode(text=text, metadata={'source': source, 'Page_No': page,
+                                           'chunk': index, 'tokens': tokens,
+                                           'Page_Text': text}),
+        score=score
+    )
+
+
+def query_chroma(metadatas, documents):
+    collection = chromadb.EphemeralClient().create_collection(
+        f'context-{uuid4().hex}'
+        )
+    collection.upsert(ids=[str(i) for i in range(len(documents))],
+                      embeddings=[[1.0, float(i)]
+                                  for i in range(len(documents))],
+                      metadatas=metadatas, documents=documents)
+
+    result = ChromaVectorStore(chroma_collection=collection).query(
+        VectorStoreQuery(query_embedding=[1.0, 0.0],
+                         similarity_top_k=len(documents))
+        )
+    return [NodeWithScore(node=node, score=score)
+            for node, score in zip(result.nodes, result.similarities)]
+
+
+class TestTokenBudgetPacker(unittest.TestCase):
+    def test_keeps_best_chunks_within_budget(self):
+        packer = TokenBudgetPacker(token_budget=250)
+        nodes = [chunk('low', 0.1, page='3'),
+                 chunk('big', 0.9, page='1', tokens=200),
+                 chunk('mid', 0.5, page='2')]
+        packed = packer.postprocess_nodes(nodes)
+        self.assertEqual([n.node.text for n in packed], ['big'])
+
+    def test_merges_consecutive_chunks_of_a_page(self):
+        packer = TokenBudgetPacker(token_budget=1000, chunk_overlap=10)
+        nodes = [chunk('the quick brown fox', 0.8, index=0),
+                 chunk('brown fox jumps over', 0.9, index=1),
+                 chunk('another page', 0.7, page='2', index=2)]
+        packed = packer.postprocess_nodes(nodes)
+
+        self.assertEqual(len(packed), 2)
+        self.assertEqual(packed[0].node.text, 'the quick brown fox jumps over')
+        self.assertEqual(packed[0].score, 0.9)
+        self.assertEqual(packed[0].node.metadata['tokens'], 190)
+        self.assertIn('Page_Text', packed[0].node.excluded_llm_metadata_keys)
+
+    def test_merged_chunk_lists_all_ids(self):
+        nodes = query_chroma(
+            metadatas=[{'source': 'A.pdf', 'Page_No': '1', 'chunk': i,
+                        'tokens': 10} for i in range(3)],
+            documents=['alpha beta', 'beta gamma', 'gamma delta'])
+        packed = TokenBudgetPacker(token_budget=1000).postprocess_nodes(nodes)
+
+        self.assertEqual(len(packed), 1)
+        self.assertEqual(chunk_ids(packed[0].node), ['0', '1', '2'])
+        self.assertIn('merged_ids', packed[0].node.excluded_llm_metadata_keys)
+        self.assertNotIn('merged_ids', packed[0].node.get_content(
+            metadata_mode=MetadataMode.LLM))
+        self.assertEqual(chunk_ids(nodes[0].node), ['0'])
+
+    def test_keeps_chunks_of_different_files_apart(self):
+        nodes = query_chroma(
+            metadatas=[{'source': 'A.pdf', 'Page_No': '1', 'chunk': 0,
+                        'tokens': 10},
+                       {'source': 'B.pdf', 'Page_No': '1', 'chunk': 1,
+                        'tokens': 10},
+                       {'source': 'A.pdf', 'Page_No': '1', 'chunk': 1,
+                        'tokens': 10}],
+            documents=['alpha beta', 'other file', 'beta gamma'])
+        packed = TokenBudgetPacker(token_budget=1000).postprocess_nodes(nodes)
+
+        self.assertEqual(sorted(n.node.get_content() for n in packed),
+                         ['alpha beta gamma', 'other file'])
+
+    def test_does_not_merge_chunks_without_source(self):
+        nodes = query_chroma(
+            metadatas=[{'Page_No': '1', 'chunk': 0, 'tokens': 10},
+                       {'Page_No': '1', 'chunk': 1, 'tokens': 10}],
+            documents=['alpha beta', 'beta gamma'])
+        packed = TokenBudgetPacker(token_budget=1000).postprocess_nodes(nodes)
+        self.assertEqual(len(packed), 2)
+
+    def test_merge_text_without_overlap(self):
+        self.assertEqual(merge_text('abc', 'xyz'), 'abc xyz')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+from llama_index.schema import TextNode
+from src.dedup import ChunkDeduplicator, drop_index, normalize
+
+TEXT = ('This agreement is made on 12 March 2021 between the supplier and '
+        'the customer for the delivery of goods described in schedule A. '
+        'Payment is due within thirty days of the invoice date.')
+
+
+def node(text, page='1'):
+    return TextNode(text=text, metadata={'page_label': page})
+
+
+class TestNormalize(unittest.TestCase):
+    def test_dates_only(self):
+        self.assertEqual(
+            normalize('Signed  on 12 March 2021, paid 2021-04-01:\nUSD 250'),
+            'signed on <date>, paid <date>: usd 250'
+            )
+
+
+class TestChunkDeduplicator(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def dedup(self, mode='skip', collection_id='database'):
+        return ChunkDeduplicator(collection_id, mode=mode, threshold=0.9,
+                                 num_perm=128, bands=16, shingle_size=5,
+                                 db_dir=self.tmp.name)
+
+    def test_skips_revision_across_uploads(self):
+        dedup = self.dedup()
+        self.assertEqual(len(dedup.filter([node(TEXT)])), 1)
+        dedup.commit()
+
+        revision = TEXT.replace('12 March 2021', '14 March 2023')
+        revision = revision.replace('  ', ' ').replace('made on', 'made  on')
+        dedup = self.dedup()
+        self.assertEqual(dedup.filter([node(revision)]), [])
+        dedup.commit()
+        report = dedup.report()
+        self.assertEqual(report['skipped'], 1)
+        self.assertEqual(report['avoided'], 1)
+
+    def test_keeps_chunks_with_different_numbers(self):
+        clause = ('Payment of USD {fee} is due within {days} days of the '
+                  'invoice date, after which interest accrues at {rate} '
+                  'percent per year on the amount outstanding.')
+        dedup = self.dedup()
+        keep = dedup.filter([
+            node(clause.format(fee='200,000', days=60, rate=10)),
+            node(clause.format(fee='250,000', days=90, rate=15)),
+            ])
+        self.assertEqual(len(keep), 2)
+
+    def test_keeps_long_chunks_with_one_number_changed(self):
+        chunks = [f'{TEXT * 10} The fee is USD {fee}.'
+                  for fee in range(100, 107)]
+        self.assertEqual(len(self.dedup().filter(map(node, chunks))), 7)
+
+    def test_keeps_different_text_and_links(self):
+        dedup = self.dedup(mode='link')
+        other = 'A completely unrelated paragraph about installing software.'
+        keep = dedup.filter([node(TEXT), node(TEXT.upper(), '2'),
+                             node(other)])
+        self.assertEqual([n.text for n in keep], [TEXT, other])
+        dedup.commit()
+        self.assertEqual(dedup.report()['linked'], 1)
+
+    def test_recreated_collection_starts_empty(self):
+        dedup = self.dedup(collection_id='first-id')
+        dedup.filter([node(TEXT)])
+        dedup.commit()
+        self.assertEqual(len(self.dedup(collection_id='second-id').filter(
+            [node(TEXT)])), 1)
+
+        drop_index('first-id', db_dir=self.tmp.name)
+        self.assertEqual(len(self.dedup(collection_id='first-id').filter(
+            [node(TEXT)])), 1)
+
+    def test_added_chunks_are_checked(self):
+        dedup = self.dedup()
+        dedup.add(['imported'], [TEXT])
+        dedup.commit()
+        self.assertEqual(self.dedup().filter([node(TEXT.upper())]), [])
+
+    def test_uncommitted_signatures_are_discarded(self):
+        dedup = self.dedup()
+        dedup.filter([node(TEXT)])
+        dedup.rollback()
+        self.assertEqual(len(self.dedup().filter([node(TEXT)])), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+from src.jobs import JobQueue
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = JobQueue(db_path=os.path.join(self.tmp.name, 'jobs.db'),
+                              lease=60, max_attempts=2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_claim_and_checkpoint(self):
+        job_id = self.queue.submit('database', 'data/a.pdf')
+        job = self.queue.claim('host:1')
+        self.assertEqual(job['id'], job_id)
+        self.assertEqual(job['status'], 'running')
+        self.assertIsNone(self.queue.claim('host:2'))
+
+        self.queue.checkpoint(job_id, done=64, total=256)
+        job = self.queue.get(job_id)
+        self.assertEqual(job['progress'], 0.25)
+
+        self.queue.complete(job_id)
+        self.assertEqual(self.queue.get(job_id)['status'], 'done')
+
+    def test_failed_job_resumes_from_checkpoint(self):
+        job_id = self.queue.submit('database', 'data/a.pdf')
+        self.queue.claim('host:1')
+        self.queue.checkpoint(job_id, done=128, total=256)
+        self.queue.fail(job_id, 'boom')
+
+        job = self.queue.claim('host:1')
+        self.assertEqual(job['done'], 128)
+        self.assertEqual(job['run_done'], 128)
+
+        self.queue.fail(job_id, 'boom')
+        self.assertEqual(self.queue.get(job_id)['status'], 'failed')
+
+    def test_abandoned_job_is_reclaimed(self):
+        queue = JobQueue(db_path=self.queue.db_path, lease=-1)
+        job_id = queue.submit('database', 'data/a.pdf')
+        queue.claim('host:1')
+        self.assertEqual(queue.claim('host:2')['id'], job_id)
+
+    def test_abandoned_job_stops_after_max_attempts(self):
+        queue = JobQueue(db_path=self.queue.db_path, lease=-1,
+                         max_attempts=2)
+        job_id = queue.submit('database', 'data/a.pdf')
+        queue.claim('host:1')
+        queue.claim('host:2')
+        self.assertIsNone(queue.claim('host:3'))
+        self.assertEqual(queue.get(job_id)['status'], 'failed')
+
+    def test_heartbeat_only_refreshes_own_job(self):
+        job_id = self.queue.submit('database', 'data/a.pdf')
+        before = self.queue.claim('host:1')['heartbeat_at']
+        self.queue.heartbeat(job_id, 'host:2')
+        self.assertEqual(self.queue.get(job_id)['heartbeat_at'], before)
+        self.queue.heartbeat(job_id, 'host:1')
+        self.assertGreater(self.queue.get(job_id)['heartbeat_at'], before)
+
+
+if __name__ == '__main__':
+    unittest.main()
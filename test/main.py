@@ -0,0 +1,131 @@
+import os
+import tempfile
+import unittest
+import chromadb
+from unittest.mock import MagicMock, patch
+from llama_index.schema import NodeWithScore, TextNode
+from src.main import _ingest, answer, build_where
+from src.registry import DocumentRegistry
+from src.utils import load_yaml_file
+
+conf = load_yaml_file(filename=os.path.join(os.path.dirname(__file__),
+                                            '..',
+                                            'config.yaml'))
+
+TEXT = ('This agreement is made on 12 March 2021 between the supplier and '
+        'the customer for the delivery of goods described in schedule A. '
+        'Payment is due within thirty days of the invoice date.')
+
+
+class CountingEmbedding:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, input):
+        self.calls += len(input)
+        return [[float(len(text)), 1.0] for text in input]
+
+
+def chunk(text, file_name, page='1'):
+    return TextNode(text=text, metadata={'file_name': file_name,
+                                         'page_label': page})
+
+
+class TestBuildWhere(unittest.TestCase):
+    def test_no_filters(self):
+        self.assertIsNone(build_where())
+        self.assertIsNone(build_where(doc_ids=[], page_range=(None, None)))
+
+    def test_documents_only(self):
+        self.assertEqual(build_where(doc_ids=['a.pdf']),
+                         {'source': {'$in': ['a.pdf']}})
+
+    def test_documents_and_page_range(self):
+        self.assertEqual(
+            build_where(doc_ids=['a.pdf'], page_range=(10, 20)),
+            {'$and': [{'source': {'$in': ['a.pdf']}},
+                      {'page': {'$gte': 10}},
+                      {'page': {'$lte': 20}}]}
+        )
+
+    def test_open_page_range(self):
+        self.assertEqual(build_where(page_range=(None, 5)),
+                         {'page': {'$lte': 5}})
+
+
+class TestAnswer(unittest.TestCase):
+    def test_sources_include_merged_chunks(self):
+        merged = TextNode(id_='a', text='alpha beta gamma',
+                          metadata={'merged_ids': ['a', 'b']})
+        index = MagicMock()
+        query_engine = index.as_query_engine.return_value
+        query_engine.retrieve.return_value = [
+            NodeWithScore(node=merged, score=0.9),
+            NodeWithScore(node=TextNode(id_='c', text='other'), score=0.5),
+            ]
+        query_engine.synthesize.return_value.response = 'answer'
+
+        result = answer(index, 'question')
+        self.assertEqual(result['sources'], ['a', 'b', 'c'])
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        for target, config in [
+            ('src.registry.load_yaml_file',
+             {'documents_db': os.path.join(self.tmp.name, 'documents.db')}),
+            ('chromadb.PersistentClient', None),
+        ]:
+            patcher = patch(target, return_value=config)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.embedding = CountingEmbedding()
+        self.collection = chromadb.EphemeralClient().create_collection(
+            f'ingest-{id(self)}', embedding_function=self.embedding
+            )
+        self.client = MagicMock()
+        self.client.get_collection.return_value = self.collection
+
+    def ingest(self, nodes, mode):
+        config = dict(conf['dedup'], enabled=True, mode=mode,
+                      dir=self.tmp.name)
+        self.client.config = {'dedup': config}
+        with patch('src.dedup.load_yaml_file',
+                   return_value={'dedup': config}):
+            return _ingest(self.client, 'ingest', nodes)
+
+    def test_linked_duplicate_is_found_under_its_own_file(self):
+        self.ingest([chunk(TEXT, 'v1.pdf')], mode='link')
+        revision = TEXT.replace('12 March 2021', '14 March 2023')
+        self.ingest([chunk(revision, 'v2.pdf', page='2')], mode='link')
+
+        self.assertEqual(self.embedding.calls, 1)
+        found = self.collection.query(
+            query_embeddings=[[1.0, 1.0]], n_results=1,
+            where={'source': {'$in': ['v2.pdf']}},
+            include=['documents', 'metadatas', 'embeddings']
+            )
+        self.assertEqual(found['documents'], [[revision]])
+        metadata = found['metadatas'][0][0]
+        self.assertEqual(metadata['page'], 2)
+        original = self.collection.get(where={'source': 'v1.pdf'},
+                                       include=['embeddings'])
+        self.assertEqual(metadata['duplicate_of'], original['ids'][0])
+        self.assertEqual(found['embeddings'][0], original['embeddings'])
+        self.assertEqual(DocumentRegistry().list(self.collection.id),
+                         ['v1.pdf', 'v2.pdf'])
+
+    def test_skipped_file_is_not_registered(self):
+        self.ingest([chunk(TEXT, 'v1.pdf')], mode='skip')
+        self.ingest([chunk(TEXT.upper(), 'v2.pdf')], mode='skip')
+
+        self.assertEqual(self.collection.count(), 1)
+        self.assertEqual(DocumentRegistry().list(self.collection.id),
+                         ['v1.pdf'])
+
+
+if __name__ == '__main__':
+    unittest.main()
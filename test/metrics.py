@@ -0,0 +1,24 @@
+import unittest
+from llama_index.callbacks import CallbackManager
+from llama_index.llms import ChatMessage, MockLLM
+from src.metrics import LLMCallTracker
+
+
+class TestLLMCallTracker(unittest.TestCase):
+    def setUp(self):
+        self.tracker = LLMCallTracker()
+        self.llm = MockLLM(callback_manager=CallbackManager([self.tracker]))
+
+    def test_counts_completions(self):
+        self.llm.complete('first')
+        self.llm.complete('second')
+        self.assertEqual(self.tracker.calls, 2)
+        self.assertTrue(all(t >= 0 for t in self.tracker.latencies))
+
+    def test_chat_over_completion_is_one_call(self):
+        self.llm.chat([ChatMessage(role='user', content='hello')])
+        self.assertEqual(self.tracker.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
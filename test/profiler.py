@@ -0,0 +1,84 @@
+import os
+import glob
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from src import profiler
+
+CONFIG = {'enabled': False, 'sample_rate': 0.0, 'top_n': 5}
+
+
+def work(n):
+    return sum(list(range(n)))
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        config = {'profiling': dict(CONFIG, dir=self.tmp.name)}
+        patcher = patch('src.profiler.load_yaml_file', return_value=config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def captures(self):
+        return sorted(glob.glob(os.path.join(self.tmp.name, 'work-*.prof')))
+
+    def test_disabled_by_default(self):
+        with patch.dict(os.environ, {'DOCGPT_PROFILE': ''}):
+            self.assertEqual(profiler.profiled('work')(work)(10), 45)
+        self.assertEqual(self.captures(), [])
+
+    def test_env_capture_and_aggregate(self):
+        with patch.dict(os.environ, {'DOCGPT_PROFILE': '1'}):
+            profiler.profiled('work')(work)(10000)
+            profiler.profiled('work')(work)(10000)
+
+        paths = self.captures()
+        self.assertEqual(len(paths), 2)
+        report = profiler.aggregate(paths, top_n=5)
+        self.assertEqual(report['captures'], 2)
+        self.assertGreater(report['peak_memory']['max'], 0)
+        self.assertTrue(any('work' in h['function']
+                            for h in report['hotspots']))
+
+    def test_overlapping_captures(self):
+        first_started = threading.Event()
+        second_started = threading.Event()
+        first_done = threading.Event()
+        results = dict()
+
+        def first(n):
+            first_started.set()
+            second_started.wait(timeout=10)
+            return work(n)
+
+        def second(n):
+            first_started.wait(timeout=10)
+            second_started.set()
+            first_done.wait(timeout=10)
+            return work(n)
+
+        def run(name, func, done=None):
+            results[name] = profiler.profiled('work')(func)(100)
+            if done is not None:
+                done.set()
+
+        with patch.dict(os.environ, {'DOCGPT_PROFILE': '1'}):
+            threads = [
+                threading.Thread(target=run,
+                                 args=('first', first, first_done)),
+                threading.Thread(target=run, args=('second', second)),
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(results, {'first': 4950, 'second': 4950})
+        self.assertEqual(len(self.captures()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import tempfile
+import unittest
+from src.registry import DocumentRegistry
+
+
+class TestDocumentRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.registry = DocumentRegistry(
+            db_path=os.path.join(self.tmp.name, 'documents.db')
+            )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_add_and_list(self):
+        self.registry.add('c1', ['b.pdf', 'a.pdf', 'b.pdf'])
+        self.registry.add('c1', ['a.pdf'])
+        self.registry.add('c2', ['c.pdf'])
+        self.assertEqual(self.registry.list('c1'), ['a.pdf', 'b.pdf'])
+        self.assertEqual(self.registry.list('c2'), ['c.pdf'])
+
+    def test_drop(self):
+        self.registry.add('c1', ['a.pdf'])
+        self.registry.drop('c1')
+        self.assertEqual(self.registry.list('c1'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+import httpx
+import openai
+from unittest.mock import patch
+from src import utils
+
+REQUEST = httpx.Request('POST', 'https://api.openai.com/v1/chat/completions')
+
+
+def status_error(cls, code):
+    return cls('error', response=httpx.Response(code, request=REQUEST),
+               body=None)
+
+
+class TestIsApiKeyValid(unittest.TestCase):
+    def setUp(self):
+        utils._api_key_cache.clear()
+        self.addCleanup(utils._api_key_cache.clear)
+
+    def check(self, *side_effect):
+        with patch.dict('os.environ', {'OPENAI_API_KEY': 'sk-test'}), \
+                patch('openai.chat.completions.create',
+                      side_effect=side_effect) as create:
+            results = [utils.is_api_key_valid(ttl=3600) for _ in side_effect]
+        return results, create.call_count
+
+    def test_caches_success(self):
+        self.assertEqual(self.check(None, None), ([True, True], 1))
+
+    def test_caches_rejected_key(self):
+        error = status_error(openai.AuthenticationError, 401)
+        self.assertEqual(self.check(error, None), ([False, False], 1))
+
+    def test_does_not_cache_transient_errors(self):
+        for error in [openai.APIConnectionError(request=REQUEST),
+                      status_error(openai.RateLimitError, 429)]:
+            utils._api_key_cache.clear()
+            self.assertEqual(self.check(error, None), ([False, True], 2))
+
+
+if __name__ == '__main__':
+    unittest.main()